@@ -3,18 +3,21 @@ API роутер для управления заявками на ваканс
 """
 
 import os
+import json
+import hashlib
 import uuid
 import logging
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_db
-from app.models import User, Vacancy, VacancyApplication
+from app.db.session import AsyncSessionLocal, get_db
+from app.models import AnalysisJob, User, Vacancy, VacancyApplication
+from app.schemas.analysis_job import AnalysisJobRead
 from app.schemas.vacancy import (
     VacancyApplicationRead,
     VacancyApplicationUpdate,
@@ -23,41 +26,15 @@ from app.schemas.vacancy import (
     InterviewSchedule
 )
 from app.api.deps import get_current_user
+from app.services.analysis_jobs import AnalysisJobQueue, analysis_job_queue
+from app.services.batch_progress import batch_store
+from app.services.resume_store import resume_store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/applications", tags=["applications"])
 
 
-async def analyze_resume_with_ai(application: VacancyApplication, vacancy: Vacancy, candidate: User, db: AsyncSession):
-    """
-    AI анализ резюме с использованием OpenRouter
-    """
-    try:
-        from app.services.resume_analysis_service import ResumeAnalysisService
-        
-        # Выполняем полный анализ резюме
-        result = await ResumeAnalysisService.analyze_resume_application(
-            application, vacancy, candidate, db
-        )
-        
-        if result.get("success"):
-            logger.info(f"Successfully analyzed resume for application {application.id}")
-        else:
-            logger.warning(f"Resume analysis failed for application {application.id}: {result.get('error')}")
-            
-    except Exception as e:
-        logger.error(f"Error in AI resume analysis: {e}")
-        # В случае ошибки создаем базовый анализ
-        application.ai_recommendation = "Анализ недоступен"
-        application.ai_match_percentage = 50
-        application.ai_analysis_date = datetime.utcnow()
-        application.notes = "Ошибка автоматического анализа. Требуется ручная проверка."
-        
-        await db.commit()
-        await db.refresh(application)
-
-
 @router.post("/apply/{vacancy_id}", response_model=VacancyApplicationRead, status_code=status.HTTP_201_CREATED)
 async def apply_to_vacancy(
     vacancy_id: int,
@@ -128,6 +105,11 @@ async def apply_to_vacancy(
             content = await resume_file.read()
             buffer.write(content)
         
+        # Одинаковые PDF ссылаются на один документ: OCR и извлечение данных выполняются один раз
+        resume_sha256 = hashlib.sha256(content).hexdigest()
+        if not await resume_store.ensure(resume_sha256):
+            resume_sha256 = None
+        
         # Создаем заявку
         application = VacancyApplication(
             vacancy_id=vacancy_id,
@@ -135,19 +117,19 @@ async def apply_to_vacancy(
             resume_file_path=file_path,
             resume_file_name=resume_file.filename,
             resume_file_size=len(content),
+            resume_sha256=resume_sha256,
             cover_letter=cover_letter,
             status="pending"
         )
         
         db.add(application)
+        await db.flush()
+        # Задача AI анализа создается в той же транзакции, что и заявка:
+        # заявка не может остаться без анализа. Ее выполнят воркеры в фоне
+        db.add(AnalysisJobQueue.new_job(application.id))
         await db.commit()
         await db.refresh(application)
-        
-        # Запускаем AI анализ в фоне
-        try:
-            await analyze_resume_with_ai(application, vacancy, current_user, db)
-        except Exception as e:
-            logger.error(f"AI analysis failed: {e}")
+        analysis_job_queue.notify()
         
         return application
         
@@ -193,6 +175,10 @@ async def get_my_applications(
             "ai_recommendation": application.ai_recommendation,
             "ai_match_percentage": application.ai_match_percentage,
             "ai_analysis_date": application.ai_analysis_date,
+            "ai_cascade": application.ai_cascade,
+            "ai_analysis": application.ai_analysis,
+            "ai_resume_data": application.ai_resume_data,
+            "ai_skills": application.ai_skills,
             "interview_date": application.interview_date,
             "interview_link": application.interview_link,
             "interview_notes": application.interview_notes,
@@ -211,6 +197,137 @@ async def get_my_applications(
     return applications
 
 
+@router.get("/search", response_model=List[VacancyApplicationWithDetails])
+async def search_applications(
+    vacancy_id: Optional[int] = Query(None, description="Только заявки на эту вакансию"),
+    skills: Optional[List[str]] = Query(None, description="Кандидат должен иметь все навыки"),
+    recommendation: Optional[List[str]] = Query(None, description="Рекомендация AI (любая из)"),
+    min_match: Optional[int] = Query(None, ge=0, le=100, description="Минимальный процент соответствия"),
+    max_match: Optional[int] = Query(None, ge=0, le=100, description="Максимальный процент соответствия"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Поиск кандидатов по результатам AI анализа (только для HR)
+    Фильтрация выполняется в БД по индексам: навыки (GIN), рекомендация и процент соответствия
+    """
+    if not current_user.is_hr:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Только HR могут искать кандидатов"
+        )
+    
+    query = (
+        select(VacancyApplication, Vacancy, User)
+        .join(Vacancy, VacancyApplication.vacancy_id == Vacancy.id)
+        .join(User, VacancyApplication.candidate_id == User.id)
+    )
+    if vacancy_id is not None:
+        query = query.where(VacancyApplication.vacancy_id == vacancy_id)
+    if skills:
+        # Навыки хранятся в нижнем регистре; @> использует GIN индекс
+        normalized = sorted({skill.strip().lower() for skill in skills if skill.strip()})
+        query = query.where(VacancyApplication.ai_skills.contains(normalized))
+    if recommendation:
+        query = query.where(VacancyApplication.ai_recommendation.in_(recommendation))
+    if min_match is not None:
+        query = query.where(VacancyApplication.ai_match_percentage >= min_match)
+    if max_match is not None:
+        query = query.where(VacancyApplication.ai_match_percentage <= max_match)
+    
+    result = await db.execute(
+        query
+        .order_by(VacancyApplication.ai_match_percentage.desc().nulls_last(), VacancyApplication.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    
+    applications = []
+    for application, vacancy, candidate in result:
+        app_data = {
+            "id": application.id,
+            "vacancy_id": application.vacancy_id,
+            "candidate_id": application.candidate_id,
+            "status": application.status,
+            "cover_letter": application.cover_letter,
+            "notes": application.notes,
+            "resume_file_path": application.resume_file_path,
+            "resume_file_name": application.resume_file_name,
+            "resume_file_size": application.resume_file_size,
+            "ai_recommendation": application.ai_recommendation,
+            "ai_match_percentage": application.ai_match_percentage,
+            "ai_analysis_date": application.ai_analysis_date,
+            "ai_cascade": application.ai_cascade,
+            "ai_analysis": application.ai_analysis,
+            "ai_resume_data": application.ai_resume_data,
+            "ai_skills": application.ai_skills,
+            "interview_date": application.interview_date,
+            "interview_link": application.interview_link,
+            "interview_notes": application.interview_notes,
+            "applied_at": application.applied_at,
+            "status_updated_at": application.status_updated_at,
+            "candidate": {
+                "id": candidate.id,
+                "username": candidate.username,
+                "email": candidate.email,
+                "skills": candidate.skills,
+                "education": candidate.education,
+                "experience_years": candidate.experience_years
+            },
+            "vacancy": {
+                "id": vacancy.id,
+                "title": vacancy.title,
+                "company_name": vacancy.company_name
+            }
+        }
+        applications.append(app_data)
+    
+    return applications
+
+
+@router.get("/{application_id}/analysis-job", response_model=AnalysisJobRead)
+async def get_analysis_job(
+    application_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Статус последней задачи AI анализа заявки
+    """
+    result = await db.execute(select(VacancyApplication).where(VacancyApplication.id == application_id))
+    application = result.scalar_one_or_none()
+    
+    if not application:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Заявка не найдена"
+        )
+    
+    if not (current_user.id == application.candidate_id or current_user.is_hr):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет прав для просмотра этой заявки"
+        )
+    
+    result = await db.execute(
+        select(AnalysisJob)
+        .where(AnalysisJob.application_id == application_id)
+        .order_by(AnalysisJob.created_at.desc(), AnalysisJob.id.desc())
+        .limit(1)
+    )
+    job = result.scalar_one_or_none()
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача анализа не найдена"
+        )
+    
+    return job
+
+
 @router.get("/{application_id}/resume")
 async def download_resume(
     application_id: int,
@@ -369,7 +486,66 @@ async def schedule_interview(
     return application
 
 
-@router.post("/batch-analyze", response_model=dict)
+@router.post("/{application_id}/analyze/stream")
+async def stream_resume_analysis(
+    application_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Потоковый AI анализ резюме (только для HR)
+    Отдает Server-Sent Events: поля анализа (match_percentage, recommendation,
+    strengths, weaknesses, ...) по мере их готовности и итоговый результат
+    """
+    if not current_user.is_hr:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Только HR могут запускать анализ резюме"
+        )
+    
+    result = await db.execute(
+        select(VacancyApplication, Vacancy)
+        .join(Vacancy, VacancyApplication.vacancy_id == Vacancy.id)
+        .where(VacancyApplication.id == application_id)
+    )
+    
+    application, vacancy = result.first() or (None, None)
+    
+    if not application:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Заявка не найдена"
+        )
+    
+    if not application.resume_file_path:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="У заявки нет резюме"
+        )
+    
+    from app.services.resume_analysis_service import ResumeAnalysisService
+    
+    async def event_stream():
+        # Сессия запроса закрывается до окончания потока, поэтому используем свою
+        async with AsyncSessionLocal() as session:
+            stream_application = await session.get(VacancyApplication, application_id)
+            try:
+                async for event in ResumeAnalysisService.stream_analyze_application(
+                    stream_application, vacancy, session
+                ):
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+            except Exception as e:
+                logger.error(f"Error in streamed resume analysis: {e}")
+                yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/batch-analyze", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
 async def batch_analyze_resumes(
     application_ids: list[int],
     current_user: User = Depends(get_current_user),
@@ -378,6 +554,9 @@ async def batch_analyze_resumes(
     """
     Пакетный анализ резюме (только для HR)
     Позволяет HR проанализировать несколько заявок одновременно для экономии времени
+
+    Анализ выполняется в фоне; ответ содержит batch_id для отслеживания прогресса
+    через GET /applications/batch/{batch_id} или поток событий /events
     """
     if not current_user.is_hr:
         raise HTTPException(
@@ -385,34 +564,81 @@ async def batch_analyze_resumes(
             detail="Только HR могут выполнять пакетный анализ"
         )
     
-    try:
-        from app.services.resume_analysis_service import ResumeAnalysisService
-        
-        # Получаем заявки
-        result = await db.execute(
-            select(VacancyApplication).where(
-                VacancyApplication.id.in_(application_ids)
-            )
+    from app.services.resume_analysis_service import ResumeAnalysisService
+    
+    # Проверяем, что заявки существуют
+    result = await db.execute(
+        select(VacancyApplication.id).where(
+            VacancyApplication.id.in_(application_ids)
         )
-        applications = result.scalars().all()
-        
-        if not applications:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Заявки не найдены"
-            )
-        
-        # Выполняем пакетный анализ
-        analysis_result = await ResumeAnalysisService.batch_analyze_applications(applications, db)
-        
-        return {
-            "message": "Пакетный анализ завершен",
-            "result": analysis_result
-        }
-        
-    except Exception as e:
-        logger.error(f"Error in batch analysis: {e}")
+    )
+    found_ids = list(result.scalars().all())
+    
+    if not found_ids:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка при пакетном анализе: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Заявки не найдены"
+        )
+    
+    batch = await ResumeAnalysisService.start_batch_analysis(db, found_ids, current_user.id)
+    
+    return {
+        "message": "Пакетный анализ запущен",
+        **await batch_store.snapshot(db, batch)
+    }
+
+
+async def _get_batch(db: AsyncSession, batch_id: str, current_user: User):
+    if not current_user.is_hr:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Только HR могут просматривать пакетный анализ"
+        )
+    
+    batch = await batch_store.get(db, batch_id)
+    if batch is None or batch.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пакет не найден"
         )
+    return batch
+
+
+@router.get("/batch/{batch_id}", response_model=dict)
+async def get_batch_analysis(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Снимок прогресса пакетного анализа и готовые результаты по заявкам
+    """
+    batch = await _get_batch(db, batch_id, current_user)
+    return {
+        **await batch_store.snapshot(db, batch),
+        "results": await batch_store.results(db, batch.id)
+    }
+
+
+@router.get("/batch/{batch_id}/events")
+async def stream_batch_analysis(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Прогресс пакетного анализа в виде Server-Sent Events
+    События: result / failed по каждой заявке (с текущим прогрессом) и finished в конце
+    """
+    batch = await _get_batch(db, batch_id, current_user)
+    
+    async def event_stream():
+        # Поток живет дольше запроса, поэтому читает прогресс в своих сессиях
+        async for event in batch_store.events(batch.id):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -127,6 +127,10 @@ async def update_vacancy(
             detail="Вы можете редактировать только свои вакансии"
         )
     
+    from app.services.resume_analysis_service import ResumeAnalysisService
+    
+    fingerprint_before = ResumeAnalysisService.vacancy_fingerprint(vacancy)
+    
     # Обновляем поля
     update_data = vacancy_update.dict(exclude_unset=True)
     for field, value in update_data.items():
@@ -137,6 +141,14 @@ async def update_vacancy(
     
     logger.info(f"Vacancy {vacancy_id} updated by {current_user.username}")
     
+    # Оценки заявок устарели, только если изменились поля, влияющие на анализ
+    if ResumeAnalysisService.vacancy_fingerprint(vacancy) != fingerprint_before:
+        try:
+            await ResumeAnalysisService.rescore_vacancy(vacancy, db)
+            await db.refresh(vacancy)
+        except Exception as e:
+            logger.error(f"Could not queue re-scoring for vacancy {vacancy_id}: {e}")
+    
     return vacancy
 
 
@@ -220,6 +232,10 @@ async def get_vacancy_applications(
             "ai_recommendation": application.ai_recommendation,
             "ai_match_percentage": application.ai_match_percentage,
             "ai_analysis_date": application.ai_analysis_date,
+            "ai_cascade": application.ai_cascade,
+            "ai_analysis": application.ai_analysis,
+            "ai_resume_data": application.ai_resume_data,
+            "ai_skills": application.ai_skills,
             "interview_date": application.interview_date,
             "interview_link": application.interview_link,
             "interview_notes": application.interview_notes,
@@ -19,9 +19,108 @@ class Settings(BaseSettings):
     # AI Service (OpenRouter)
     openrouter_api_key: str = ""
     openrouter_model: str = "anthropic/claude-3.5-sonnet"  # Модель по умолчанию
+    # Режим анализа резюме: "fused" - анализ и извлечение данных одним запросом, "split" - двумя
+    ai_analysis_mode: str = "fused"
+
+    # Каскад моделей: дешевая модель оценивает первой, пограничные результаты уходят openrouter_model
+    ai_cascade_enabled: bool = False
+    ai_cascade_model: str = "anthropic/claude-3-haiku"
+    ai_cascade_band_low: int = 55  # Границы "пограничного" match_percentage (включительно)
+    ai_cascade_band_high: int = 85
+
+    # Бэкенд LLM: "auto" (OpenRouter при наличии ключа, иначе симуляция), "openrouter", "simulated"
+    ai_backend: str = "auto"
+
+    # Симуляция LLM для тестов и нагрузочного тестирования
+    ai_sim_latency_distribution: str = "fixed"  # fixed, lognormal
+    ai_sim_latency_ms: float = 500.0  # Фиксированная задержка или медиана lognormal
+    ai_sim_latency_sigma: float = 0.5  # Разброс lognormal
+    ai_sim_tail_probability: float = 0.0  # Вероятность хвостового выброса задержки
+    ai_sim_tail_multiplier: float = 10.0  # Во сколько раз выброс дольше обычного ответа
+    ai_sim_error_rate: float = 0.0  # Доля ответов 500
+    ai_sim_throttle_rate: float = 0.0  # Доля ответов 429
+    ai_sim_completion_tokens: int = 150
+
+    # HTTP клиент AI сервиса (общий пул соединений)
+    ai_http_limit: int = 100  # Всего соединений в пуле
+    ai_http_limit_per_host: int = 20  # Соединений на один хост
+    ai_http_dns_ttl: int = 300  # Время кэширования DNS в секундах
+    ai_http_keepalive_timeout: float = 60.0  # Время жизни простаивающего соединения
+    ai_http_connect_timeout: float = 10.0  # Таймаут установки соединения
+    ai_http_request_timeout: float = 120.0  # Таймаут одного запроса к LLM
+
+    # Планировщик запросов к LLM (адаптивный параллелизм и лимиты частоты)
+    ai_initial_concurrency: int = 4
+    ai_min_concurrency: int = 1
+    ai_max_concurrency: int = 32
+    ai_requests_per_second: float = 5.0  # 0 - без ограничения
+    ai_tokens_per_minute: float = 0.0  # 0 - без ограничения
+    ai_max_retries: int = 3  # Повторы при 429/5xx
+    ai_retry_backoff: float = 1.0  # Базовая пауза, если нет Retry-After
+
+    # Circuit breaker для OpenRouter
+    ai_breaker_failure_threshold: int = 5  # Ошибок подряд до размыкания
+    ai_breaker_recovery_timeout: float = 30.0  # Секунд до пробного запроса
+
+    # Кэш результатов LLM
+    ai_cache_enabled: bool = True
+    ai_cache_max_entries: int = 1000  # Размер in-memory LRU
+    ai_cache_ttl_seconds: int = 7 * 24 * 3600  # Время жизни записи
+    ai_cache_persistent: bool = True  # Хранить результаты в таблице БД
+
+    # Предобработка текста резюме перед LLM
+    resume_preprocessing_enabled: bool = True
+    resume_token_budget: int = 4000  # Максимум токенов текста резюме в промпте
+
+    # Извлечение текста PDF: текстовый слой локально, OCR только для страниц-сканов
+    pdf_text_layer_enabled: bool = True
+    pdf_text_layer_min_chars: int = 20  # Меньше символов на странице - считаем ее сканом
+
+    # Пул процессов разбора PDF
+    pdf_engine_workers: int = 2
+    pdf_engine_max_tasks_per_child: int = 50  # Перезапуск процесса после N задач (утечки памяти pdfplumber)
+    pdf_engine_timeout: float = 60.0  # Максимальное время задачи разбора (без ожидания свободного процесса)
+    pdf_max_pages: int = 50  # Страницы сверх лимита не разбираются
+    pdf_pages_per_chunk: int = 10  # Большие PDF разбираются частями параллельно
+
+    # Таймауты этапов анализа заявки
+    analysis_stage_ocr_timeout: float = 300.0
+    analysis_stage_llm_timeout: float = 180.0
+
+    # Пакетный анализ заявок
+    batch_ocr_concurrency: int = 4  # Одновременных OCR запросов
+    batch_llm_concurrency: int = 8  # Одновременных запросов к LLM
+    batch_queue_size: int = 16  # Размер очередей между этапами
+    batch_write_size: int = 50  # Заявок в одном UPDATE
+    batch_sync_interval: float = 1.0  # Как часто записывать прогресс пакета в его задачи
+    batch_events_poll_interval: float = 1.0  # Как часто поток событий пакета опрашивает БД
+
+    # Очередь задач AI анализа
+    analysis_worker_in_process: bool = True  # Запускать воркеры в процессе API
+    analysis_worker_concurrency: int = 2
+    analysis_job_max_attempts: int = 3
+    analysis_job_retry_backoff: float = 30.0  # Пауза перед повтором, удваивается с каждой попыткой
+    analysis_job_lease_timeout: float = 600.0  # Через сколько секунд зависшую задачу можно забрать снова
+    analysis_job_poll_interval: float = 2.0
+    analysis_job_shutdown_timeout: float = 30.0  # Сколько ждать текущие задачи при остановке
 
     # External services
-    ocr_service_url: str = "http://localhost:8001"
+    ocr_service_url: str = "http://localhost:8001"  # Один адрес или несколько реплик через запятую
+    ocr_breaker_failure_threshold: int = 3
+    ocr_breaker_recovery_timeout: float = 60.0
+    ocr_http_limit: int = 20  # Максимум соединений в пуле OCR клиента
+    ocr_http_keepalive_timeout: float = 30.0
+    ocr_connect_timeout: float = 10.0  # Таймаут установки соединения
+    ocr_read_timeout: float = 300.0  # Максимальная пауза между частями ответа (распознавание идет долго)
+    ocr_upload_chunk_size: int = 256 * 1024  # Размер части PDF при загрузке
+    ocr_download_chunk_size: int = 64 * 1024
+    ocr_lean_mode: bool = True  # Запрашивать только текст страниц (без координат блоков) потоком NDJSON
+    ocr_latency_window: int = 100  # Сколько последних задержек учитывать в перцентилях
+    ocr_hedge_percentile: float = 0.95  # Дольше этого перцентиля запрос дублируется на другую реплику
+    ocr_hedge_min_samples: int = 20  # Без достаточной статистики запросы не дублируются
+    ocr_hedge_min_delay: float = 5.0  # Минимальная задержка перед дублированием
+    ocr_page_cache_enabled: bool = True  # Кэш OCR текста страниц по хэшу их содержимого
+    ocr_page_cache_max_bytes: int = 64 * 1024 * 1024  # Суммарный объем текста в кэше
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -12,7 +12,10 @@ from app.api import users as users_router
 from app.api import vacancies as vacancies_router
 from app.api import applications as applications_router
 from app.db.session import Base, engine
-from app.services.ai_service import init_ai_service
+from app.services.ai_service import init_ai_service, get_ai_service, close_ai_service
+from app.services.resume_analysis_service import ResumeAnalysisService, ocr_client
+from app.services.pdf_engine import pdf_engine
+from app.services.analysis_jobs import analysis_job_queue
 from app.core.config import settings
 
 # Настройка логирования
@@ -43,12 +46,30 @@ async def on_startup():
     # Инициализируем AI сервис (OpenRouter)
     try:
         init_ai_service(settings.openrouter_api_key, settings.openrouter_model)
-        if settings.openrouter_api_key and settings.openrouter_api_key != "test":
+        ai_service = get_ai_service()
+        await ai_service.start()
+        if not ai_service.backend.simulated:
             logger.info("OpenRouter AI service initialized successfully")
         else:
-            logger.info("AI service initialized in test mode (no API key)")
+            logger.info("AI service initialized with simulated backend (no API key)")
     except Exception as e:
         logger.warning(f"Failed to initialize AI service: {e}")
+    
+    await ocr_client.start()
+    
+    # Воркеры очереди AI анализа
+    if settings.analysis_worker_in_process:
+        await analysis_job_queue.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await analysis_job_queue.stop()
+    
+    # Закрываем пулы соединений AI сервиса и OCR клиента, пул процессов разбора PDF
+    await close_ai_service()
+    await ocr_client.close()
+    await pdf_engine.close()
 
 
 app.include_router(auth_router.router)
@@ -59,4 +80,29 @@ app.include_router(applications_router.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    # degraded - хотя бы один upstream за разомкнутым circuit breaker
+    circuits = {"ocr": ocr_client.circuit_state()}
+    try:
+        circuits["openrouter"] = get_ai_service().breaker.state
+    except Exception:
+        pass
+    degraded = any(state != "closed" for state in circuits.values())
+    return {
+        "status": "degraded" if degraded else "ok",
+        "circuits": circuits,
+        "ocr_endpoints": {endpoint.url: endpoint.breaker.state for endpoint in ocr_client.endpoints},
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики внутренних сервисов (кэш AI и т.д.)"""
+    try:
+        ai_stats = get_ai_service().get_stats()
+    except Exception:
+        ai_stats = None
+    return {
+        "ai": ai_stats,
+        "resume_analysis": ResumeAnalysisService.get_stats(),
+        "analysis_jobs": analysis_job_queue.stats(),
+    }
\ No newline at end of file
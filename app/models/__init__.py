@@ -1,4 +1,8 @@
 from .user import User
 from .vacancy import Vacancy, VacancyApplication
+from .ai_cache import AIResultCache
+from .analysis_batch import AnalysisBatch
+from .analysis_job import AnalysisJob
+from .resume_document import ResumeDocument
 
-__all__ = ["User", "Vacancy", "VacancyApplication"]
+__all__ = ["User", "Vacancy", "VacancyApplication", "AIResultCache", "AnalysisBatch", "AnalysisJob", "ResumeDocument"]
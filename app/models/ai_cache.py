@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.session import Base
+
+
+# Постоянный уровень кэша результатов LLM (общий для всех воркеров uvicorn)
+class AIResultCache(Base):
+    __tablename__ = "ai_result_cache"
+
+    # SHA-256 от входных данных запроса (текст резюме, требования, модель, версия промпта)
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)  # analysis, extraction
+    model: Mapped[str] = mapped_column(String(255), nullable=False)
+    result: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.session import Base
+
+
+# Результат OCR и извлечения данных PDF резюме (один на файл, общий для всех заявок с этим файлом)
+class ResumeDocument(Base):
+    __tablename__ = "resume_documents"
+
+    # SHA-256 содержимого PDF
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    # OCR
+    pages: Mapped[list | None] = mapped_column(JSONB, nullable=True)  # Текст по страницам
+    text: Mapped[str | None] = mapped_column(Text, nullable=True)  # Полный текст (без предобработки)
+    page_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    ocr_duration_ms: Mapped[float | None] = mapped_column(Float, nullable=True)
+    ocr_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    # Структурированные данные резюме (extract_resume_data)
+    resume_data: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    extraction_version: Mapped[str | None] = mapped_column(String(20), nullable=True)  # Версия промпта извлечения
+    extracted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
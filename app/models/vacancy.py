@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, String, Text, Float, ForeignKey, Boolean
+from sqlalchemy import DateTime, Integer, String, Text, Float, ForeignKey, Boolean, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
@@ -47,6 +48,17 @@ class Vacancy(Base):
 # Таблица для связи вакансий и кандидатов (many-to-many)
 class VacancyApplication(Base):
     __tablename__ = "vacancy_applications"
+    __table_args__ = (
+        # Фильтры поиска кандидатов: процент соответствия и рекомендация в рамках вакансии, навыки (@>)
+        Index("ix_vacancy_applications_vacancy_match", "vacancy_id", "ai_match_percentage"),
+        Index("ix_vacancy_applications_vacancy_recommendation", "vacancy_id", "ai_recommendation"),
+        Index(
+            "ix_vacancy_applications_ai_skills",
+            "ai_skills",
+            postgresql_using="gin",
+            postgresql_ops={"ai_skills": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     vacancy_id: Mapped[int] = mapped_column(Integer, ForeignKey("vacancies.id"), nullable=False)
@@ -59,6 +71,9 @@ class VacancyApplication(Base):
     resume_file_path: Mapped[str | None] = mapped_column(String(500), nullable=True)  # Путь к PDF файлу
     resume_file_name: Mapped[str | None] = mapped_column(String(255), nullable=True)  # Оригинальное имя файла
     resume_file_size: Mapped[int | None] = mapped_column(Integer, nullable=True)  # Размер файла в байтах
+    resume_sha256: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("resume_documents.sha256"), nullable=True, index=True
+    )  # Результаты OCR и извлечения данных (ResumeDocument)
     
     # Дополнительная информация
     cover_letter: Mapped[str | None] = mapped_column(Text, nullable=True)  # Сопроводительное письмо
@@ -68,6 +83,11 @@ class VacancyApplication(Base):
     ai_recommendation: Mapped[str | None] = mapped_column(Text, nullable=True)  # Рекомендация от ИИ
     ai_match_percentage: Mapped[int | None] = mapped_column(Integer, nullable=True)  # Процент соответствия (0-100)
     ai_analysis_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # Дата анализа ИИ
+    ai_cascade: Mapped[dict | None] = mapped_column(JSONB, nullable=True)  # Оценки каскада моделей и решение об эскалации
+    ai_vacancy_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)  # Отпечаток требований вакансии на момент анализа
+    ai_analysis: Mapped[dict | None] = mapped_column(JSONB, nullable=True)  # Сильные/слабые стороны, детальный анализ
+    ai_resume_data: Mapped[dict | None] = mapped_column(JSONB, nullable=True)  # Извлеченные данные резюме
+    ai_skills: Mapped[list | None] = mapped_column(JSONB, nullable=True)  # Навыки кандидата в нижнем регистре (для поиска)
     
     # Интервью
     interview_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
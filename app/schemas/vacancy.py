@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -57,6 +57,10 @@ class VacancyApplicationBase(BaseModel):
     ai_recommendation: Optional[str] = None
     ai_match_percentage: Optional[int] = None
     ai_analysis_date: Optional[datetime] = None
+    ai_cascade: Optional[dict] = None
+    ai_analysis: Optional[dict] = None
+    ai_resume_data: Optional[dict] = None
+    ai_skills: Optional[List[str]] = None
 
 
 class VacancyApplicationCreate(VacancyApplicationBase):
@@ -2,68 +2,240 @@
 Сервис для работы с OpenRouter API
 """
 
-import asyncio
-import aiohttp
 import json
 import logging
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
+from app.core.config import settings
+from app.services.analysis_cache import AnalysisCache
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.json_stream import IncrementalJSONObjectParser
+from app.services.llm_backends import LLMBackend, LLMBackendError, create_llm_backend
+from app.services.request_scheduler import AdaptiveScheduler
+
 logger = logging.getLogger(__name__)
 
+# Версии промптов входят в ключ кэша: при изменении текста промпта их нужно увеличить
+ANALYSIS_PROMPT_VERSION = "2"
+EXTRACTION_PROMPT_VERSION = "1"
+FUSED_PROMPT_VERSION = "2"
+
+ANALYSIS_SYSTEM_PROMPT = """Ты - эксперт HR-аналитик. Твоя задача - анализировать резюме кандидатов и оценивать их соответствие требованиям вакансий.
+
+ВАЖНО: Отвечай ТОЛЬКО в JSON формате, без дополнительного текста или объяснений."""
+
+EXTRACTION_SYSTEM_PROMPT = """Ты - эксперт по извлечению структурированных данных из резюме. Твоя задача - извлекать информацию из текста резюме и представлять её в структурированном виде.
+
+ВАЖНО: Отвечай ТОЛЬКО в JSON формате, без дополнительного текста."""
+
+FUSED_SYSTEM_PROMPT = """Ты - эксперт HR-аналитик. Твоя задача - анализировать резюме кандидатов, оценивать их соответствие требованиям вакансий и извлекать структурированные данные из резюме.
+
+ВАЖНО: Отвечай ТОЛЬКО в JSON формате, без дополнительного текста или объяснений."""
+
+# Итоговые поля идут первыми, чтобы при потоковой отдаче они приходили раньше остальных
+ANALYSIS_JSON_FORMAT = """{
+    "match_percentage": "Процент соответствия (0-100)",
+    "recommendation": "Рекомендация: 'Рекомендуется к интервью', 'Требует дополнительной проверки', или 'Низкое соответствие'",
+    "strengths": ["сильная сторона1", "сильная сторона2"],
+    "weaknesses": ["слабая сторона1", "слабая сторона2"],
+    "candidate_name": "Имя кандидата",
+    "experience_years": "Количество лет опыта (число)",
+    "education": "Образование",
+    "skills": ["навык1", "навык2", "навык3"],
+    "about": "Краткое описание о себе",
+    "detailed_analysis": "Подробный анализ соответствия требованиям"
+}"""
+
+EXTRACTION_JSON_FORMAT = """{
+    "name": "Полное имя",
+    "email": "email@example.com",
+    "phone": "+7 (xxx) xxx-xx-xx",
+    "experience_years": "Количество лет опыта (число)",
+    "education": "Образование",
+    "skills": ["навык1", "навык2"],
+    "languages": ["язык1", "язык2"],
+    "about": "О себе",
+    "work_experience": [
+        {
+            "company": "Название компании",
+            "position": "Должность",
+            "period": "Период работы",
+            "description": "Описание обязанностей"
+        }
+    ],
+    "education_history": [
+        {
+            "institution": "Учебное заведение",
+            "degree": "Степень",
+            "year": "Год окончания"
+        }
+    ]
+}"""
+
+class AIUnavailableError(Exception):
+    """LLM бэкенд не ответил (ошибка, исчерпаны повторы или разомкнут breaker)"""
+
+
+def parse_match_percentage(value: Any) -> Optional[int]:
+    """Приводит match_percentage из ответа LLM ("85", "85%", 85.0) к числу 0-100"""
+    if isinstance(value, (int, float)):
+        return max(0, min(100, int(value)))
+    if isinstance(value, str):
+        digits = value.strip().rstrip("%").strip()
+        try:
+            return max(0, min(100, int(float(digits))))
+        except ValueError:
+            return None
+    return None
+
+
 class AIService:
-    def __init__(self, api_key: str, model: str = "anthropic/claude-3.5-sonnet", base_url: str = "openrouter.ai"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "anthropic/claude-3.5-sonnet",
+        base_url: str = "openrouter.ai",
+        cache: Optional[AnalysisCache] = None,
+        scheduler: Optional[AdaptiveScheduler] = None,
+        backend: Optional[LLMBackend] = None,
+    ):
         self.api_key = api_key
         self.model = model
         self.base_url = base_url
-        self.base_headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': 'http://localhost:8000',  # Для OpenRouter
-            'X-Title': 'VTB Mortech HR System'
-        }
+        self.cache = cache
+        self.backend = backend or create_llm_backend(api_key, base_url)
+        self.scheduler = scheduler or AdaptiveScheduler(
+            initial_concurrency=settings.ai_initial_concurrency,
+            min_concurrency=settings.ai_min_concurrency,
+            max_concurrency=settings.ai_max_concurrency,
+            requests_per_second=settings.ai_requests_per_second,
+            tokens_per_minute=settings.ai_tokens_per_minute,
+        )
+        self.breaker = CircuitBreaker(
+            "openrouter",
+            failure_threshold=settings.ai_breaker_failure_threshold,
+            recovery_timeout=settings.ai_breaker_recovery_timeout,
+        )
+        self.cascade_total = 0
+        self.cascade_escalated = 0
     
-    async def _make_request(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> Dict[str, Any]:
-        """Базовый метод для отправки запроса к OpenRouter API"""
-        
-        # Если нет API ключа, используем заглушку для тестирования
-        if not self.api_key or self.api_key == "test":
-            logger.info("Using AI mock for testing (no real API key)")
-            return self._mock_ai_response(messages)
-        
-        url = f"https://{self.base_url}/api/v1/chat/completions"
-        
-        payload = {
+    async def start(self):
+        """Подготавливает бэкенд (пул HTTP соединений для OpenRouter)"""
+        await self.backend.start()
+    
+    async def close(self):
+        """Освобождает ресурсы бэкенда"""
+        await self.backend.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики AI сервиса"""
+        return {
             "model": self.model,
+            "backend": type(self.backend).__name__,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "scheduler": self.scheduler.stats(),
+            "circuit": self.breaker.stats(),
+            "cascade": {
+                "enabled": settings.ai_cascade_enabled,
+                "total": self.cascade_total,
+                "escalated": self.cascade_escalated,
+            },
+        }
+    
+    def _build_payload(self, messages: List[Dict[str, str]], temperature: float, model: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "model": model or self.model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": 2000  # Уменьшаем для экономии токенов
         }
+    
+    @staticmethod
+    def _estimate_tokens(payload: Dict[str, Any]) -> int:
+        """Оценка расхода токенов для лимита TPM (~4 символа на токен)"""
+        return sum(len(m.get("content", "")) for m in payload["messages"]) // 4 + payload["max_tokens"]
+    
+    async def _make_request(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Базовый метод для отправки запроса к LLM бэкенду"""
+        payload = self._build_payload(messages, temperature, model)
+        estimated_tokens = self._estimate_tokens(payload)
         
-        async with aiohttp.ClientSession() as session:
+        for attempt in range(settings.ai_max_retries + 1):
             try:
-                async with session.post(url, json=payload, headers=self.base_headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"OpenRouter API error {response.status}: {error_text}")
-                        # В случае ошибки API, используем заглушку
-                        return self._mock_ai_response(messages)
+                # При разомкнутом breaker не ждем таймаутов upstream
+                self.breaker.before_call()
+                async with self.scheduler.slot(estimated_tokens):
+                    result = await self.backend.complete(payload)
+                used_tokens = (result.get("usage") or {}).get("total_tokens", estimated_tokens)
+                self.scheduler.on_success(used_tokens - estimated_tokens)
+                self.breaker.record_success()
+                return result
+            except CircuitOpenError as e:
+                logger.warning(f"LLM API unavailable: {e}")
+            except LLMBackendError as e:
+                if e.retryable:
+                    # Перегрузка upstream: снижаем параллелизм и повторяем после паузы
+                    self.scheduler.on_overload(e.retry_after or settings.ai_retry_backoff * 2 ** attempt)
+                    if attempt < settings.ai_max_retries:
+                        logger.warning(f"LLM API {e.status}, retry {attempt + 1}/{settings.ai_max_retries}")
+                        continue
+                    self.breaker.record_failure()
+                logger.error(f"LLM API error: {e}")
             except Exception as e:
-                logger.error(f"Error calling OpenRouter API: {e}")
-                # В случае ошибки, используем заглушку
+                self.breaker.record_failure()
+                logger.error(f"Error calling LLM API: {e}")
+            # Случайная заглушка допустима только в режиме симуляции; ошибка реального
+            # бэкенда должна дойти до вызывающего кода (fallback и повтор задачи)
+            if self.backend.simulated:
                 return self._mock_ai_response(messages)
+            raise AIUnavailableError("LLM backend request failed")
     
-    def _mock_ai_response(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
-        """Заглушка для тестирования AI без реального API"""
-        import random
-        import time
-        
-        # Имитируем задержку
-        time.sleep(0.5)
+    async def _stream_request(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        simulated_content: str = "",
+        model: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Запрос к LLM в потоковом режиме, выдает фрагменты текста ответа"""
+        payload = self._build_payload(messages, temperature, model)
+        estimated_tokens = self._estimate_tokens(payload)
         
+        self.breaker.before_call()
+        async with self.scheduler.slot(estimated_tokens):
+            if self.backend.simulated:
+                chunks = self.backend.stream_text(simulated_content)
+            else:
+                chunks = self.backend.stream(payload)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except LLMBackendError as e:
+                if e.retryable:
+                    self.scheduler.on_overload(e.retry_after)
+                    self.breaker.record_failure()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+        self.scheduler.on_success()
+        self.breaker.record_success()
+    
+    def _cache_key(self, kind: str, prompt_version: str, *parts: str, model: Optional[str] = None) -> Optional[str]:
+        """Ключ кэша для запроса или None, если кэш не используется"""
+        # Заглушка возвращает случайные данные, такие результаты не кэшируем
+        if self.cache is None or self.backend.simulated:
+            return None
+        return AnalysisCache.make_key(kind, model or self.model, prompt_version, *parts)
+    
+    def _mock_ai_response(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Заглушка ответа AI (fallback при ошибке API, без задержки)"""
         # Извлекаем последнее сообщение
         last_message = messages[-1]["content"] if messages else "Test message"
         
@@ -77,91 +249,277 @@ class AIService:
             "mock": True
         }
     
-    async def analyze_resume(self, resume_text: str, vacancy_requirements: str) -> Dict[str, Any]:
-        """
-        Анализ резюме и оценка соответствия вакансии
+    async def _request_json(
+        self,
+        kind: str,
+        prompt_version: str,
+        cache_parts: tuple,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        mock_factory,
+        fallback_factory,
+        model: Optional[str] = None,
+        with_source: bool = False,
+    ) -> Any:
         """
-        messages = [
-            {
-                "role": "system",
-                "content": """Ты - эксперт HR-аналитик. Твоя задача - анализировать резюме кандидатов и оценивать их соответствие требованиям вакансий.
-
-ВАЖНО: Отвечай ТОЛЬКО в JSON формате, без дополнительного текста или объяснений."""
-            },
-            {
-                "role": "user",
-                "content": f"""Проанализируй резюме кандидата и оцени его соответствие требованиям вакансии.
+        Общий путь запроса к LLM с JSON ответом: кэш, заглушка, разбор и fallback
 
-РЕЗЮМЕ КАНДИДАТА:
-{resume_text}
-
-ТРЕБОВАНИЯ ВАКАНСИИ:
-{vacancy_requirements}
-
-Верни анализ в следующем JSON формате:
-{{
-    "candidate_name": "Имя кандидата",
-    "experience_years": "Количество лет опыта (число)",
-    "education": "Образование",
-    "skills": ["навык1", "навык2", "навык3"],
-    "about": "Краткое описание о себе",
-    "match_percentage": "Процент соответствия (0-100)",
-    "strengths": ["сильная сторона1", "сильная сторона2"],
-    "weaknesses": ["слабая сторона1", "слабая сторона2"],
-    "recommendation": "Рекомендация: 'Рекомендуется к интервью', 'Требует дополнительной проверки', или 'Низкое соответствие'",
-    "detailed_analysis": "Подробный анализ соответствия требованиям"
-}}"""
-            }
-        ]
+        При with_source=True возвращает (data, source), source: llm, cache, mock или fallback
+        """
+        data, source = await self._request_json_with_source(
+            kind, prompt_version, cache_parts, messages, temperature, mock_factory, fallback_factory, model
+        )
+        return (data, source) if with_source else data
+    
+    async def _request_json_with_source(
+        self,
+        kind: str,
+        prompt_version: str,
+        cache_parts: tuple,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        mock_factory,
+        fallback_factory,
+        model: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        cache_key = self._cache_key(kind, prompt_version, *cache_parts, model=model)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached, "cache"
         
         try:
-            result = await self._make_request(messages, temperature=0.3)
+            result = await self._make_request(messages, temperature=temperature, model=model)
             
-            # Если это заглушка, создаем тестовый анализ
+            # Если это заглушка, создаем тестовые данные
             if result.get('mock'):
-                return self._create_mock_analysis(resume_text, vacancy_requirements)
+                return mock_factory(), "mock"
             
             # Извлекаем текст ответа
             ai_response = result.get('choices', [{}])[0].get('message', {}).get('content', '{}')
             
             # Парсим JSON ответ
             try:
-                analysis = json.loads(ai_response)
-                return analysis
+                data = json.loads(ai_response)
             except json.JSONDecodeError:
                 # Если не удалось распарсить JSON, создаем базовую структуру
-                logger.warning("Failed to parse AI response as JSON, creating fallback")
-                return self._create_fallback_analysis(resume_text)
+                logger.warning(f"Failed to parse AI {kind} response as JSON, creating fallback")
+                return fallback_factory(), "fallback"
+            
+            if cache_key:
+                await self.cache.set(cache_key, kind, model or self.model, data)
+            return data, "llm"
                 
         except Exception as e:
-            logger.error(f"Error in resume analysis: {e}")
-            return self._create_fallback_analysis(resume_text)
+            logger.error(f"Error in AI {kind} request: {e}")
+            return fallback_factory(), "fallback"
+    
+    def _analysis_messages(self, resume_text: str, vacancy_requirements: str) -> List[Dict[str, str]]:
+        """Промпт анализа соответствия резюме вакансии"""
+        return [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"""Проанализируй резюме кандидата и оцени его соответствие требованиям вакансии.
+
+РЕЗЮМЕ КАНДИДАТА:
+{resume_text}
+
+ТРЕБОВАНИЯ ВАКАНСИИ:
+{vacancy_requirements}
+
+Верни анализ в следующем JSON формате:
+{ANALYSIS_JSON_FORMAT}"""
+            }
+        ]
     
-    async def batch_analyze_resumes(self, resume_analyses: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    async def analyze_resume(
+        self,
+        resume_text: str,
+        vacancy_requirements: str,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Пакетный анализ нескольких резюме
+        Анализ резюме и оценка соответствия вакансии
+        """
+        return await self._request_json(
+            "analysis",
+            ANALYSIS_PROMPT_VERSION,
+            (resume_text, vacancy_requirements),
+            self._analysis_messages(resume_text, vacancy_requirements),
+            temperature=0.3,
+            mock_factory=lambda: self._create_mock_analysis(resume_text, vacancy_requirements),
+            fallback_factory=lambda: self._create_fallback_analysis(resume_text),
+            model=model,
+        )
+    
+    async def score_resume(self, resume_text: str, vacancy_requirements: str) -> Dict[str, Any]:
+        """Оценка резюме: через каскад моделей, если он включен, иначе основной моделью"""
+        if settings.ai_cascade_enabled:
+            return await self.cascade_analyze_resume(resume_text, vacancy_requirements)
+        return await self.analyze_resume(resume_text, vacancy_requirements)
+    
+    async def cascade_analyze_resume(
+        self,
+        resume_text: str,
+        vacancy_requirements: str,
+        first_pass: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
-        tasks = []
-        for analysis_data in resume_analyses:
-            task = self.analyze_resume(
-                analysis_data['resume_text'], 
-                analysis_data['vacancy_requirements']
-            )
-            tasks.append(task)
+        Каскадная оценка: сначала дешевая модель, пограничные результаты - основной модели
+
+        first_pass - уже полученный ответ дешевой модели (например, из fused запроса).
+        Решение каскада сохраняется в поле "cascade" результата.
+        """
+        cheap_model = settings.ai_cascade_model
+        if first_pass is None:
+            first_pass = await self.analyze_resume(resume_text, vacancy_requirements, model=cheap_model)
         
-        # Выполняем все запросы параллельно
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.cascade_total += 1
+        reason = self._escalation_reason(first_pass)
+        cascade = {
+            "cheap_model": cheap_model,
+            "cheap_match_percentage": first_pass.get("match_percentage"),
+            "cheap_recommendation": first_pass.get("recommendation"),
+            "escalated": reason is not None,
+            "escalation_reason": reason,
+            "final_model": cheap_model,
+        }
+        if reason is None:
+            return {**first_pass, "cascade": cascade}
         
-        # Обрабатываем результаты
-        processed_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.error(f"Error in batch analysis {i}: {result}")
-                processed_results.append(self._create_fallback_analysis(resume_analyses[i]['resume_text']))
-            else:
-                processed_results.append(result)
+        self.cascade_escalated += 1
+        final = await self.analyze_resume(resume_text, vacancy_requirements)
+        cascade.update({
+            "final_model": self.model,
+            "expensive_match_percentage": final.get("match_percentage"),
+            "expensive_recommendation": final.get("recommendation"),
+        })
+        return {**final, "cascade": cascade}
+    
+    @staticmethod
+    def _escalation_reason(analysis: Dict[str, Any]) -> Optional[str]:
+        """Причина передачи результата основной модели или None, если результат окончательный"""
+        # Базовая структура при ошибке запроса или разбора ответа - низкая уверенность
+        if analysis.get("fallback"):
+            return "fallback"
+        match_percentage = parse_match_percentage(analysis.get("match_percentage"))
+        if match_percentage is None:
+            return "no_match_percentage"
+        if settings.ai_cascade_band_low <= match_percentage <= settings.ai_cascade_band_high:
+            return "borderline"
+        return None
+    
+    async def stream_analyze_resume(
+        self,
+        resume_text: str,
+        vacancy_requirements: str,
+        model: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Потоковый анализ резюме
+
+        Выдает события {"type": "field", "field": ..., "value": ...} по мере готовности
+        полей ответа и в конце {"type": "result", "analysis": {...}} с полным результатом,
+        совпадающим с результатом analyze_resume.
+        """
+        cache_key = self._cache_key("analysis", ANALYSIS_PROMPT_VERSION, resume_text, vacancy_requirements, model=model)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                for field, value in cached.items():
+                    yield {"type": "field", "field": field, "value": value}
+                yield {"type": "result", "analysis": cached}
+                return
+        
+        chunks = self._stream_request(
+            self._analysis_messages(resume_text, vacancy_requirements),
+            temperature=0.3,
+            simulated_content=json.dumps(
+                self._create_mock_analysis(resume_text, vacancy_requirements), ensure_ascii=False
+            ) if self.backend.simulated else "",
+            model=model,
+        )
+        
+        parser = IncrementalJSONObjectParser()
+        try:
+            async for chunk in chunks:
+                for field, value in parser.feed(chunk):
+                    yield {"type": "field", "field": field, "value": value}
+        except Exception as e:
+            # Поток прервался: получаем результат обычным запросом
+            logger.error(f"Error in streamed resume analysis, falling back to regular request: {e}")
+            yield {"type": "result", "analysis": await self.analyze_resume(resume_text, vacancy_requirements, model=model)}
+            return
+        
+        text = parser.text
+        try:
+            analysis = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        except ValueError:
+            logger.warning("Failed to parse streamed AI response as JSON, creating fallback")
+            yield {"type": "result", "analysis": self._create_fallback_analysis(resume_text)}
+            return
+        
+        if cache_key:
+            await self.cache.set(cache_key, "analysis", model or self.model, analysis)
+        yield {"type": "result", "analysis": analysis}
+    
+    async def analyze_and_extract(
+        self,
+        resume_text: str,
+        vacancy_requirements: str,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Анализ соответствия и извлечение данных резюме одним запросом к LLM
+
+        Возвращает словарь с ключами "analysis", "resume_data" и "source" (см. _request_json)
+        """
+        messages = [
+            {"role": "system", "content": FUSED_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"""Проанализируй резюме кандидата, оцени его соответствие требованиям вакансии и извлеки структурированные данные из резюме.
+
+РЕЗЮМЕ КАНДИДАТА:
+{resume_text}
+
+ТРЕБОВАНИЯ ВАКАНСИИ:
+{vacancy_requirements}
+
+Верни результат в следующем JSON формате:
+{{
+"analysis": {ANALYSIS_JSON_FORMAT},
+"resume_data": {EXTRACTION_JSON_FORMAT}
+}}"""
+            }
+        ]
+        result, source = await self._request_json(
+            "fused",
+            FUSED_PROMPT_VERSION,
+            (resume_text, vacancy_requirements),
+            messages,
+            temperature=0.2,
+            mock_factory=lambda: {
+                "analysis": self._create_mock_analysis(resume_text, vacancy_requirements),
+                "resume_data": self._create_mock_resume_data(),
+            },
+            fallback_factory=lambda: {},
+            model=model,
+            with_source=True,
+        )
         
-        return processed_results
+        # Недостающие части ответа заменяем базовыми структурами
+        analysis = result.get("analysis") if isinstance(result, dict) else None
+        resume_data = result.get("resume_data") if isinstance(result, dict) else None
+        if not isinstance(analysis, dict):
+            logger.warning("Fused AI response has no analysis part, creating fallback")
+            analysis = self._create_fallback_analysis(resume_text)
+        if not isinstance(resume_data, dict):
+            logger.warning("Fused AI response has no resume_data part, creating fallback")
+            resume_data = self._create_fallback_resume_data()
+            source = "fallback"
+        return {"analysis": analysis, "resume_data": resume_data, "source": source}
     
     def _create_mock_analysis(self, resume_text: str, vacancy_requirements: str) -> Dict[str, Any]:
         """Создает тестовый анализ для демонстрации"""
@@ -197,21 +555,22 @@ class AIService:
             weaknesses = ["Недостаточный опыт", "Отсутствуют ключевые навыки"]
         
         return {
+            "match_percentage": match_percentage,
+            "recommendation": recommendation,
+            "strengths": strengths,
+            "weaknesses": weaknesses,
             "candidate_name": name,
             "experience_years": experience,
             "education": education,
             "skills": skills,
             "about": f"Опытный разработчик с {experience} годами опыта в области IT",
-            "match_percentage": match_percentage,
-            "strengths": strengths,
-            "weaknesses": weaknesses,
-            "recommendation": recommendation,
             "detailed_analysis": f"Кандидат {name} имеет {experience} лет опыта. Образование: {education}. Навыки: {', '.join(skills)}. Соответствие требованиям: {match_percentage}%."
         }
     
     def _create_fallback_analysis(self, resume_text: str) -> Dict[str, Any]:
-        """Создает базовый анализ в случае ошибки AI"""
+        """Создает базовый анализ в случае ошибки AI (помечен "fallback", не является оценкой)"""
         return {
+            "fallback": True,
             "candidate_name": "Не определено",
             "experience_years": 0,
             "education": "Не указано",
@@ -224,17 +583,19 @@ class AIService:
             "detailed_analysis": "Автоматический анализ недоступен. Требуется ручная проверка."
         }
     
-    async def extract_resume_data(self, resume_text: str) -> Dict[str, Any]:
+    async def extract_resume_data(
+        self,
+        resume_text: str,
+        model: Optional[str] = None,
+        with_source: bool = False
+    ) -> Any:
         """
         Извлечение структурированных данных из резюме
+
+        При with_source=True возвращает (data, source), см. _request_json
         """
         messages = [
-            {
-                "role": "system",
-                "content": """Ты - эксперт по извлечению структурированных данных из резюме. Твоя задача - извлекать информацию из текста резюме и представлять её в структурированном виде.
-
-ВАЖНО: Отвечай ТОЛЬКО в JSON формате, без дополнительного текста."""
-            },
+            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
             {
                 "role": "user",
                 "content": f"""Извлеки структурированные данные из резюме кандидата.
@@ -243,54 +604,20 @@ class AIService:
 {resume_text}
 
 Верни данные в JSON формате:
-{{
-    "name": "Полное имя",
-    "email": "email@example.com",
-    "phone": "+7 (xxx) xxx-xx-xx",
-    "experience_years": "Количество лет опыта (число)",
-    "education": "Образование",
-    "skills": ["навык1", "навык2"],
-    "languages": ["язык1", "язык2"],
-    "about": "О себе",
-    "work_experience": [
-        {{
-            "company": "Название компании",
-            "position": "Должность",
-            "period": "Период работы",
-            "description": "Описание обязанностей"
-        }}
-    ],
-    "education_history": [
-        {{
-            "institution": "Учебное заведение",
-            "degree": "Степень",
-            "year": "Год окончания"
-        }}
-    ]
-}}"""
+{EXTRACTION_JSON_FORMAT}"""
             }
         ]
-        
-        try:
-            result = await self._make_request(messages, temperature=0.2)
-            
-            # Если это заглушка, создаем тестовые данные
-            if result.get('mock'):
-                return self._create_mock_resume_data()
-            
-            # Извлекаем текст ответа
-            ai_response = result.get('choices', [{}])[0].get('message', {}).get('content', '{}')
-            
-            try:
-                data = json.loads(ai_response)
-                return data
-            except json.JSONDecodeError:
-                logger.warning("Failed to parse resume extraction as JSON")
-                return self._create_fallback_resume_data()
-                
-        except Exception as e:
-            logger.error(f"Error in resume data extraction: {e}")
-            return self._create_fallback_resume_data()
+        return await self._request_json(
+            "extraction",
+            EXTRACTION_PROMPT_VERSION,
+            (resume_text,),
+            messages,
+            temperature=0.2,
+            mock_factory=self._create_mock_resume_data,
+            fallback_factory=self._create_fallback_resume_data,
+            model=model,
+            with_source=with_source,
+        )
     
     def _create_mock_resume_data(self) -> Dict[str, Any]:
         """Создает тестовые данные резюме"""
@@ -357,4 +684,16 @@ def get_ai_service() -> AIService:
 def init_ai_service(api_key: str, model: str = "anthropic/claude-3.5-sonnet"):
     """Инициализировать AI сервис"""
     global ai_service
-    ai_service = AIService(api_key, model)
\ No newline at end of file
+    cache = None
+    if settings.ai_cache_enabled:
+        cache = AnalysisCache(
+            max_entries=settings.ai_cache_max_entries,
+            ttl_seconds=settings.ai_cache_ttl_seconds,
+            persistent=settings.ai_cache_persistent,
+        )
+    ai_service = AIService(api_key, model, cache=cache)
+
+async def close_ai_service():
+    """Закрыть HTTP клиент AI сервиса"""
+    if ai_service is not None:
+        await ai_service.close()
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Кэш результатов LLM анализа резюме (in-memory LRU + таблица в БД)
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.db.session import AsyncSessionLocal
+from app.models.ai_cache import AIResultCache
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Двухуровневый кэш результатов LLM, адресуемый хэшем входных данных"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: int = 7 * 24 * 3600,
+        persistent: bool = True,
+        session_factory: Optional[Callable] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt_version: str, *parts: str) -> str:
+        """Вычисляет ключ кэша по всем входным данным запроса"""
+        raw = json.dumps([kind, model, prompt_version, *parts], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Ищет результат сначала в памяти, затем в БД"""
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        if self.persistent:
+            value = await self._get_persistent(key)
+            if value is not None:
+                self.persistent_hits += 1
+                await self._put_memory(key, value)
+                return copy.deepcopy(value)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, kind: str, model: str, value: Dict[str, Any]):
+        """Сохраняет результат в оба уровня кэша"""
+        await self._put_memory(key, copy.deepcopy(value))
+        if self.persistent:
+            await self._set_persistent(key, kind, model, value)
+
+    async def _put_memory(self, key: str, value: Dict[str, Any]):
+        async with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def _get_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(select(AIResultCache).where(AIResultCache.key == key))
+                row = result.scalar_one_or_none()
+                if row is None:
+                    return None
+                if row.created_at < datetime.utcnow() - timedelta(seconds=self.ttl_seconds):
+                    await session.delete(row)
+                    await session.commit()
+                    return None
+                return row.result
+        except Exception as e:
+            logger.warning(f"AI cache lookup failed: {e}")
+            return None
+
+    async def _set_persistent(self, key: str, kind: str, model: str, value: Dict[str, Any]):
+        try:
+            async with self.session_factory() as session:
+                await session.merge(AIResultCache(
+                    key=key,
+                    kind=kind,
+                    model=model,
+                    result=value,
+                    created_at=datetime.utcnow(),
+                ))
+                await session.commit()
+        except IntegrityError:
+            # Другой воркер успел записать тот же ключ
+            pass
+        except Exception as e:
+            logger.warning(f"AI cache store failed: {e}")
+
+    async def clear(self):
+        """Очищает in-memory уровень кэша"""
+        async with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов кэша"""
+        hits = self.memory_hits + self.persistent_hits
+        total = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
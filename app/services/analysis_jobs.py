@@ -0,0 +1,305 @@
+"""
+Очередь задач AI анализа резюме в БД и пул воркеров
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models import AnalysisJob, User, Vacancy, VacancyApplication
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisJobQueue:
+    """
+    Задачи хранятся в таблице analysis_jobs, поэтому переживают перезапуск воркеров.
+    Неудачные попытки повторяются с экспоненциальной паузой, задача, взятая упавшим
+    воркером, снова становится доступной по истечении аренды (analysis_job_lease_timeout).
+    Пока задача выполняется, воркер продлевает аренду, поэтому долгий анализ
+    не забирает второй воркер.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.running = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    @staticmethod
+    def new_job(application_id: int) -> AnalysisJob:
+        """
+        Задача анализа заявки без коммита - для добавления в транзакцию,
+        создающую заявку (после коммита нужно вызвать notify())
+        """
+        return AnalysisJob(
+            application_id=application_id,
+            status="pending",
+            max_attempts=settings.analysis_job_max_attempts,
+            run_after=datetime.utcnow(),
+        )
+
+    @staticmethod
+    async def enqueue(db: AsyncSession, application_id: int) -> AnalysisJob:
+        """Создает задачу анализа заявки"""
+        job = AnalysisJobQueue.new_job(application_id)
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        analysis_job_queue.notify()
+        return job
+
+    @staticmethod
+    async def enqueue_many(db: AsyncSession, application_ids: List[int]) -> List[AnalysisJob]:
+        """Создает задачи анализа нескольких заявок одним коммитом"""
+        jobs = [AnalysisJobQueue.new_job(application_id) for application_id in application_ids]
+        db.add_all(jobs)
+        await db.commit()
+        analysis_job_queue.notify()
+        return jobs
+
+    def notify(self):
+        """Будит воркеры, ожидающие новых задач"""
+        self._wakeup.set()
+
+    async def start(self, concurrency: Optional[int] = None):
+        """Запускает пул воркеров"""
+        if self._tasks:
+            return
+        self._stopping = False
+        concurrency = concurrency or settings.analysis_worker_concurrency
+        self._tasks = [asyncio.create_task(self._worker_loop(n)) for n in range(concurrency)]
+        logger.info(f"Analysis job workers started: {concurrency} ({self.worker_id})")
+
+    async def stop(self):
+        """Останавливает воркеры, давая текущим задачам время завершиться"""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        done, pending = await asyncio.wait(self._tasks, timeout=settings.analysis_job_shutdown_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        logger.info("Analysis job workers stopped")
+
+    async def _worker_loop(self, n: int):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                job_id = await self._claim()
+            except Exception as e:
+                logger.error(f"Error claiming analysis job: {e}")
+                job_id = None
+
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.analysis_job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.process(job_id)
+
+    @staticmethod
+    def _claimable(now: datetime):
+        """Условие: задача ждет выполнения или ее аренда истекла"""
+        lease_expired = now - timedelta(seconds=settings.analysis_job_lease_timeout)
+        return or_(
+            and_(AnalysisJob.status == "pending", AnalysisJob.run_after <= now),
+            and_(AnalysisJob.status == "running", AnalysisJob.locked_at < lease_expired),
+        )
+
+    async def _claim(self) -> Optional[int]:
+        """
+        Берет одну готовую к выполнению задачу
+
+        SELECT ... FOR UPDATE SKIP LOCKED: строки, которые в этот момент забирают
+        другие воркеры (в том числе в других процессах), пропускаются, поэтому
+        одна задача не обрабатывается дважды. Условный UPDATE дополнительно
+        защищает от гонки на СУБД без SKIP LOCKED.
+        """
+        async with AsyncSessionLocal() as db:
+            while True:
+                now = datetime.utcnow()
+                result = await db.execute(
+                    select(AnalysisJob.id)
+                    .where(self._claimable(now))
+                    .order_by(AnalysisJob.run_after)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job_id = result.scalar_one_or_none()
+                if job_id is None:
+                    await db.rollback()
+                    return None
+
+                claimed = await db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == job_id, self._claimable(now))
+                    .values(
+                        status="running",
+                        locked_by=self.worker_id,
+                        locked_at=now,
+                        attempts=AnalysisJob.attempts + 1,
+                        updated_at=now,
+                    )
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    return job_id
+
+    async def process(self, job_id: int):
+        """Выполняет взятую задачу и записывает итог"""
+        from app.services.resume_analysis_service import ResumeAnalysisService
+
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(AnalysisJob, job_id)
+                result = await db.execute(
+                    select(VacancyApplication, Vacancy, User)
+                    .join(Vacancy, VacancyApplication.vacancy_id == Vacancy.id)
+                    .join(User, VacancyApplication.candidate_id == User.id)
+                    .where(VacancyApplication.id == job.application_id)
+                )
+                row = result.first()
+                if row is None:
+                    await self._finish(db, job, "Application not found", retry=False)
+                    return
+
+                application, vacancy, candidate = row
+                try:
+                    analysis = await ResumeAnalysisService.analyze_resume_application(
+                        application, vacancy, candidate, db
+                    )
+                    error = None if analysis.get("success") else analysis.get("error", "Analysis failed")
+                except Exception as e:
+                    logger.error(f"Error in analysis job {job_id}: {e}")
+                    await db.rollback()
+                    error = str(e)
+                if await self._finish(db, job, error) and error is None:
+                    await ResumeAnalysisService.requeue_stale(db, [application.id])
+        except asyncio.CancelledError:
+            # Остановка воркера: возвращаем задачу в очередь, не дожидаясь истечения аренды
+            await asyncio.shield(self._release(job_id))
+            raise
+        except Exception as e:
+            logger.error(f"Error processing analysis job {job_id}: {e}")
+        finally:
+            heartbeat.cancel()
+            self.running -= 1
+
+    async def _heartbeat(self, job_id: int):
+        """Продлевает аренду задачи, пока она выполняется"""
+        interval = max(1.0, settings.analysis_job_lease_timeout / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    renewed = await db.execute(
+                        update(AnalysisJob)
+                        .where(
+                            AnalysisJob.id == job_id,
+                            AnalysisJob.status == "running",
+                            AnalysisJob.locked_by == self.worker_id,
+                        )
+                        .values(locked_at=datetime.utcnow())
+                    )
+                    await db.commit()
+                if renewed.rowcount == 0:
+                    logger.warning(f"Lease of analysis job {job_id} was lost")
+                    return
+            except Exception as e:
+                logger.error(f"Could not renew lease of analysis job {job_id}: {e}")
+
+    async def _finish(self, db: AsyncSession, job: AnalysisJob, error: Optional[str], retry: bool = True) -> bool:
+        """
+        Записывает итог, если задача все еще за этим воркером
+
+        Если аренда истекла и задачу забрал другой воркер, его состояние не трогаем.
+        Строка блокируется до коммита, поэтому забрать задачу между проверкой
+        и записью нельзя.
+        """
+        # Анализ мог откатить сессию - перечитываем задачу
+        await db.refresh(job, with_for_update=True)
+        if job.status != "running" or job.locked_by != self.worker_id:
+            job_id, owner = job.id, job.locked_by
+            await db.rollback()
+            logger.warning(f"Analysis job {job_id} was taken over by {owner}, result not recorded")
+            return False
+        self.record_result(job, error, retry)
+        await db.commit()
+        return True
+
+    def record_result(self, job: AnalysisJob, error: Optional[str], retry: bool = True):
+        """Итог попытки: done, отложенный повтор или failed после max_attempts (без коммита)"""
+        now = datetime.utcnow()
+        job.locked_by = None
+        job.locked_at = None
+        job.last_error = error
+        if error is None:
+            job.status = "done"
+            job.finished_at = now
+            self.completed += 1
+        elif retry and job.attempts < job.max_attempts:
+            job.status = "pending"
+            job.run_after = now + timedelta(seconds=settings.analysis_job_retry_backoff * 2 ** (job.attempts - 1))
+            self.retried += 1
+            logger.warning(f"Analysis job {job.id} failed (attempt {job.attempts}), retry at {job.run_after}: {error}")
+        else:
+            job.status = "failed"
+            job.finished_at = now
+            self.failed += 1
+            logger.error(f"Analysis job {job.id} failed permanently: {error}")
+
+    async def _release(self, job_id: int):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(AnalysisJob)
+                    .where(
+                        AnalysisJob.id == job_id,
+                        AnalysisJob.status == "running",
+                        AnalysisJob.locked_by == self.worker_id,
+                    )
+                    .values(
+                        status="pending",
+                        locked_by=None,
+                        locked_at=None,
+                        attempts=AnalysisJob.attempts - 1,
+                        run_after=datetime.utcnow(),
+                    )
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Could not release analysis job {job_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._tasks),
+            "running": self.running,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+# Глобальный экземпляр очереди (воркеры запускаются в main.py или app.worker)
+analysis_job_queue = AnalysisJobQueue()
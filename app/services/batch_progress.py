@@ -0,0 +1,337 @@
+"""
+Прогресс пакетного анализа заявок: хранится в БД, поэтому доступен из любого
+процесса API и переживает перезапуск
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models import AnalysisBatch, AnalysisJob, VacancyApplication
+from app.services.analysis_jobs import analysis_job_queue
+
+logger = logging.getLogger(__name__)
+
+
+class BatchProgress:
+    """
+    Прогресс пакета, который выполняет этот процесс
+
+    Задачи пакета создаются в статусе pending, занятыми этим воркером: run_after
+    отодвинут на срок аренды, поэтому воркеры очереди их не берут. Начатые
+    конвейером заявки переводятся в running, результаты копятся в памяти и раз
+    в batch_sync_interval записываются в задачи, аренда при этом продлевается.
+    Если процесс остановится, аренда истечет и оставшиеся заявки выполнят
+    воркеры очереди.
+    """
+
+    def __init__(self, batch_id: str, job_ids: Dict[int, int], session_factory: Optional[Callable] = None):
+        self.id = batch_id
+        self.job_ids = job_ids  # application_id -> id задачи
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._started: List[int] = []
+        self._done: List[int] = []
+        self._failed: List[Tuple[int, str]] = []
+        self._lease_renewed_at = time.monotonic()
+
+    def item_started(self, application_id: int):
+        self._started.append(application_id)
+
+    def item_done(self, application_id: int, analysis: Dict[str, Any]):
+        self._done.append(application_id)
+
+    def item_failed(self, application_id: int, error: str, started: bool = True):
+        self._failed.append((application_id, error))
+
+    async def run_sync(self):
+        """Периодическая запись прогресса, пока пакет выполняется"""
+        while True:
+            await asyncio.sleep(settings.batch_sync_interval)
+            await self.sync()
+
+    async def sync(self):
+        """Записывает накопленные результаты в задачи пакета и продлевает аренду"""
+        started, self._started = self._started, []
+        done, self._done = self._done, []
+        failed, self._failed = self._failed, []
+        renew = time.monotonic() - self._lease_renewed_at >= settings.analysis_job_lease_timeout / 3
+        if not (started or done or failed or renew):
+            return
+
+        worker_id = analysis_job_queue.worker_id
+        try:
+            async with self.session_factory() as db:
+                now = datetime.utcnow()
+                if started:
+                    await db.execute(
+                        update(AnalysisJob)
+                        .where(
+                            AnalysisJob.id.in_([self.job_ids[app_id] for app_id in started]),
+                            AnalysisJob.status == "pending",
+                            AnalysisJob.locked_by == worker_id,
+                        )
+                        .values(status="running", attempts=AnalysisJob.attempts + 1, locked_at=now, updated_at=now)
+                    )
+                if done:
+                    await db.execute(
+                        update(AnalysisJob)
+                        .where(
+                            AnalysisJob.id.in_([self.job_ids[app_id] for app_id in done]),
+                            AnalysisJob.locked_by == worker_id,
+                        )
+                        .values(
+                            status="done",
+                            locked_by=None,
+                            locked_at=None,
+                            last_error=None,
+                            finished_at=now,
+                            updated_at=now,
+                        )
+                    )
+                if failed:
+                    # Неудачные заявки повторяются по правилам очереди (backoff, max_attempts)
+                    errors = {self.job_ids[app_id]: error for app_id, error in failed}
+                    result = await db.execute(
+                        select(AnalysisJob).where(AnalysisJob.id.in_(errors), AnalysisJob.locked_by == worker_id)
+                    )
+                    for job in result.scalars().all():
+                        # Заявка, отклоненная до запуска (нет файла), тоже расходует попытку
+                        job.attempts = max(job.attempts, 1)
+                        analysis_job_queue.record_result(job, errors[job.id])
+                if renew:
+                    await db.execute(
+                        update(AnalysisJob)
+                        .where(
+                            AnalysisJob.batch_id == self.id,
+                            AnalysisJob.status == "running",
+                            AnalysisJob.locked_by == worker_id,
+                        )
+                        .values(locked_at=now)
+                    )
+                    await db.execute(
+                        update(AnalysisJob)
+                        .where(
+                            AnalysisJob.batch_id == self.id,
+                            AnalysisJob.status == "pending",
+                            AnalysisJob.locked_by == worker_id,
+                        )
+                        .values(locked_at=now, run_after=self.lease_until(now))
+                    )
+                await db.commit()
+            if renew:
+                self._lease_renewed_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Could not save progress of batch {self.id}: {e}")
+            # Запишем при следующей синхронизации
+            self._started = started + self._started
+            self._done = done + self._done
+            self._failed = failed + self._failed
+            return
+
+        if done:
+            await self._requeue_stale(done)
+
+    async def _requeue_stale(self, application_ids: List[int]):
+        """Пакет загрузил требования вакансий при запуске - сверяем их после оценки"""
+        from app.services.resume_analysis_service import ResumeAnalysisService
+
+        try:
+            async with self.session_factory() as db:
+                await ResumeAnalysisService.requeue_stale(db, application_ids)
+        except Exception as e:
+            logger.error(f"Could not re-check requirements of batch {self.id} applications: {e}")
+
+    @staticmethod
+    def lease_until(now: datetime) -> datetime:
+        """До какого момента воркеры очереди не берут еще не начатые заявки пакета"""
+        return now + timedelta(seconds=settings.analysis_job_lease_timeout)
+
+    async def finish(self, error: Optional[str] = None):
+        """
+        Записывает оставшиеся результаты; заявки, до которых конвейер не дошел
+        (ошибка всего пакета), передаются воркерам очереди
+        """
+        await self.sync()
+        if error:
+            logger.error(f"Batch {self.id} stopped: {error}")
+        try:
+            async with self.session_factory() as db:
+                released = 0
+                for status, attempts in (("running", AnalysisJob.attempts - 1), ("pending", AnalysisJob.attempts)):
+                    result = await db.execute(
+                        update(AnalysisJob)
+                        .where(
+                            AnalysisJob.batch_id == self.id,
+                            AnalysisJob.status == status,
+                            AnalysisJob.locked_by == analysis_job_queue.worker_id,
+                        )
+                        .values(
+                            status="pending",
+                            locked_by=None,
+                            locked_at=None,
+                            attempts=attempts,
+                            run_after=datetime.utcnow(),
+                        )
+                    )
+                    released += result.rowcount
+                await db.commit()
+            if released:
+                analysis_job_queue.notify()
+        except Exception as e:
+            logger.error(f"Could not release remaining jobs of batch {self.id}: {e}")
+
+
+class BatchStore:
+    """Создание пакетов и чтение их прогресса из БД"""
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def create(
+        self,
+        db: AsyncSession,
+        application_ids: List[int],
+        owner_id: Optional[int] = None,
+    ) -> Tuple[AnalysisBatch, BatchProgress]:
+        """Создает пакет и его задачи (занятые этим процессом) одним коммитом"""
+        batch = AnalysisBatch(id=uuid.uuid4().hex, owner_id=owner_id, total=len(application_ids))
+        db.add(batch)
+        await db.flush()
+
+        now = datetime.utcnow()
+        jobs = [
+            AnalysisJob(
+                application_id=application_id,
+                batch_id=batch.id,
+                status="pending",
+                attempts=0,
+                max_attempts=settings.analysis_job_max_attempts,
+                run_after=BatchProgress.lease_until(now),
+                locked_by=analysis_job_queue.worker_id,
+                locked_at=now,
+            )
+            for application_id in application_ids
+        ]
+        db.add_all(jobs)
+        await db.flush()
+        job_ids = {job.application_id: job.id for job in jobs}
+        await db.commit()
+        return batch, BatchProgress(batch.id, job_ids, self.session_factory)
+
+    def track(self, task: asyncio.Task):
+        """Хранит ссылку на фоновую задачу пакета, пока она выполняется"""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get(self, db: AsyncSession, batch_id: str) -> Optional[AnalysisBatch]:
+        return await db.get(AnalysisBatch, batch_id)
+
+    async def snapshot(self, db: AsyncSession, batch: AnalysisBatch) -> Dict[str, Any]:
+        result = await db.execute(
+            select(AnalysisJob.status, func.count())
+            .where(AnalysisJob.batch_id == batch.id)
+            .group_by(AnalysisJob.status)
+        )
+        counts = dict(result.all())
+        processed = counts.get("done", 0)
+        failed = counts.get("failed", 0)
+        in_flight = counts.get("running", 0)
+        pending = counts.get("pending", 0)
+        status = "running" if in_flight or pending else "done"
+
+        finished = processed + failed
+        if status != "running":
+            eta = 0.0
+        elif not finished:
+            eta = None
+        else:
+            elapsed = (datetime.utcnow() - batch.created_at).total_seconds()
+            eta = round(elapsed / finished * max(0, batch.total - finished), 1)
+
+        return {
+            "batch_id": batch.id,
+            "status": status,
+            "total": batch.total,
+            "processed": processed,
+            "failed": failed,
+            "in_flight": in_flight,
+            "pending": pending,
+            "eta_seconds": eta,
+        }
+
+    async def results(
+        self,
+        db: AsyncSession,
+        batch_id: str,
+        exclude_job_ids: Iterable[int] = (),
+    ) -> List[Dict[str, Any]]:
+        """Итоги завершенных заявок пакета в порядке завершения"""
+        query = (
+            select(AnalysisJob, VacancyApplication)
+            .join(VacancyApplication, VacancyApplication.id == AnalysisJob.application_id)
+            .where(AnalysisJob.batch_id == batch_id, AnalysisJob.status.in_(("done", "failed")))
+            .order_by(AnalysisJob.finished_at, AnalysisJob.id)
+        )
+        exclude_job_ids = list(exclude_job_ids)
+        if exclude_job_ids:
+            query = query.where(AnalysisJob.id.notin_(exclude_job_ids))
+        result = await db.execute(query)
+
+        items = []
+        for job, application in result.all():
+            if job.status == "done":
+                items.append({
+                    "type": "result",
+                    "job_id": job.id,
+                    "application_id": application.id,
+                    "match_percentage": application.ai_match_percentage,
+                    "recommendation": application.ai_recommendation,
+                    "analysis": application.ai_analysis,
+                })
+            else:
+                items.append({
+                    "type": "failed",
+                    "job_id": job.id,
+                    "application_id": application.id,
+                    "error": job.last_error,
+                })
+        return items
+
+    async def events(self, batch_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Итоги заявок пакета с начала, затем новые по мере появления
+        (опрос БД раз в batch_events_poll_interval) и finished в конце
+        """
+        sent: Set[int] = set()
+        while True:
+            async with self.session_factory() as db:
+                batch = await self.get(db, batch_id)
+                if batch is None:
+                    return
+                # Снимок до итогов: если пакет уже завершен, итоги будут полными
+                progress = await self.snapshot(db, batch)
+                items = await self.results(db, batch_id, exclude_job_ids=sent)
+
+            for item in items:
+                sent.add(item["job_id"])
+                yield {**item, "progress": progress}
+            if progress["status"] != "running":
+                yield {"type": "finished", "status": progress["status"], "progress": progress}
+                return
+            await asyncio.sleep(settings.batch_events_poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running_in_process": len(self._tasks)}
+
+
+# Глобальное хранилище пакетов
+batch_store = BatchStore()
@@ -0,0 +1,100 @@
+"""
+Circuit breaker для внешних сервисов (OpenRouter, OCR)
+"""
+
+import logging
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонен без обращения к upstream, т.к. breaker разомкнут"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Состояния: closed - запросы идут как обычно; open - запросы сразу отклоняются;
+    half_open - после recovery_timeout пропускается до half_open_max_calls пробных
+    запросов, успех замыкает breaker, ошибка снова размыкает.
+
+    Размыкается после failure_threshold ошибок подряд.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._probe_started_at = 0.0
+        self.total_failures = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"Circuit '{self.name}' is half-open, probing upstream")
+        return self._state
+
+    def before_call(self):
+        """Проверяет, можно ли выполнить запрос; иначе CircuitOpenError"""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN:
+            now = time.monotonic()
+            # Пробный запрос мог быть отменен без результата - не ждем его вечно
+            if now - self._probe_started_at >= self.recovery_timeout:
+                self._half_open_calls = 0
+            if self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                self._probe_started_at = now
+                return
+        self.rejected += 1
+        retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        if self._state != CLOSED:
+            logger.info(f"Circuit '{self.name}' closed, upstream recovered")
+        self._state = CLOSED
+        self._consecutive_failures = 0
+
+    def record_failure(self):
+        self.total_failures += 1
+        self._consecutive_failures += 1
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logger.warning(f"Circuit '{self.name}' opened after {self._consecutive_failures} failures")
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "total_failures": self.total_failures,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,194 @@
+"""
+Гибридное извлечение текста PDF: локальный текстовый слой + OCR только для страниц-сканов
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ocr_client import OCRClient
+from app.services.page_ocr_cache import PageOCRCache
+from app.services.pdf_engine import PDFExtractionEngine
+
+logger = logging.getLogger(__name__)
+
+
+class HybridTextExtractor:
+    """
+    Большинство резюме - PDF, сгенерированные из редактора, с текстовым слоем.
+    Их страницы читаются локально; в OCR сервис уходят только страницы без
+    текста (сканы, картинки), собранные в отдельный PDF. Результаты
+    объединяются в исходном порядке страниц.
+
+    Распознанные страницы кэшируются по хэшу содержимого: при повторной
+    загрузке резюме или общих шаблонных страницах в OCR уходят только
+    страницы, которые еще не распознавались.
+    """
+
+    def __init__(
+        self,
+        ocr_client: OCRClient,
+        engine: PDFExtractionEngine,
+        page_cache: Optional[PageOCRCache] = None,
+    ):
+        self.ocr_client = ocr_client
+        self.engine = engine
+        self.page_cache = page_cache
+        self.documents = 0
+        self.documents_local_only = 0
+        self.documents_with_ocr = 0
+        self.text_layer_pages = 0
+        self.ocr_pages = 0
+        self.ocr_failed_pages = 0
+        self.cached_pages = 0
+
+    @staticmethod
+    def _has_text_layer(page_text: str) -> bool:
+        return len(page_text.strip()) >= settings.pdf_text_layer_min_chars
+
+    async def extract_pages(
+        self,
+        pdf_path: str,
+        on_page: Optional[Callable[[int, str], None]] = None,
+    ) -> Tuple[List[str], bool]:
+        """
+        Текст всех страниц PDF в исходном порядке и признак полноты
+
+        False - часть страниц-сканов не распознана (сервис недоступен или вернул
+        не все страницы), на их месте пустые строки. Такой результат годится
+        для текущего анализа, но сохранять его нельзя.
+
+        on_page(номер, текст) вызывается, как только текст страницы известен:
+        для текстового слоя и кэша сразу, для OCR - по мере ответа сервиса.
+        Итоговый текст страницы может отличаться (например, OCR вернул не все
+        страницы), поэтому результат on_page нужно сверять с итоговым.
+        """
+        on_page = on_page or (lambda index, text: None)
+        self.documents += 1
+        try:
+            pages = await self.engine.extract_pages_text_layer(pdf_path)
+        except Exception as e:
+            logger.warning(f"Local text layer extraction of {pdf_path} failed: {e}")
+            pages = []
+        if not pages:
+            # PDF не открылся локально - отдаем целиком в OCR
+            self.documents_with_ocr += 1
+            ocr_pages = await self.ocr_client.extract_pages(pdf_path, on_page)
+            self.ocr_pages += len(ocr_pages)
+            return ocr_pages, bool(ocr_pages)
+
+        scanned = [index for index, text in enumerate(pages) if not self._has_text_layer(text)]
+        self.text_layer_pages += len(pages) - len(scanned)
+        for index, text in enumerate(pages):
+            if self._has_text_layer(text):
+                on_page(index, text)
+        if not scanned:
+            self.documents_local_only += 1
+            return pages, True
+
+        self.documents_with_ocr += 1
+        ocr_texts = await self._ocr_pages_cached(pdf_path, scanned, len(pages), on_page)
+        for index, text in ocr_texts.items():
+            if text.strip():
+                pages[index] = text
+        logger.info(
+            f"Hybrid extraction of {pdf_path}: {len(pages) - len(scanned)} text layer pages, "
+            f"{len(scanned)} OCR pages"
+        )
+        complete = len(ocr_texts) == len(scanned)
+        if not complete:
+            logger.warning(f"OCR failed for {len(scanned) - len(ocr_texts)} scanned pages of {pdf_path}")
+        return pages, complete
+
+    async def _page_fingerprints(self, pdf_path: str, page_indexes: List[int]) -> Optional[List[str]]:
+        if self.page_cache is None:
+            return None
+        try:
+            return await self.engine.page_fingerprints(pdf_path, page_indexes)
+        except Exception as e:
+            logger.warning(f"Could not fingerprint pages of {pdf_path}, OCR cache skipped: {e}")
+            return None
+
+    async def _ocr_pages_cached(
+        self,
+        pdf_path: str,
+        page_indexes: List[int],
+        page_count: int,
+        on_page: Callable[[int, str], None],
+    ) -> Dict[int, str]:
+        """OCR текст выбранных страниц по индексам; страницы из кэша в OCR не отправляются"""
+        fingerprints = await self._page_fingerprints(pdf_path, page_indexes)
+        texts: Dict[int, str] = {}
+        if fingerprints is not None:
+            for index, fingerprint in zip(page_indexes, fingerprints):
+                text = self.page_cache.get(fingerprint)
+                if text is not None:
+                    texts[index] = text
+                    on_page(index, text)
+            self.cached_pages += len(texts)
+
+        missing = [index for index in page_indexes if index not in texts]
+        if not missing:
+            return texts
+
+        def on_ocr_page(position: int, text: str):
+            # Страницы отдельного PDF со сканами идут в порядке missing
+            if position < len(missing):
+                on_page(missing[position], text)
+
+        ocr_pages = await self._ocr_pages(pdf_path, missing, page_count, on_ocr_page)
+        self.ocr_pages += len(ocr_pages)
+        # Если сервис вернул не все страницы, соответствие страниц и текста не гарантировано:
+        # такие страницы остаются пустыми, а не получают текст соседних
+        if len(ocr_pages) != len(missing):
+            self.ocr_failed_pages += len(missing)
+            if ocr_pages:
+                logger.warning(
+                    f"OCR returned {len(ocr_pages)} of {len(missing)} scanned pages of {pdf_path}, "
+                    f"pages cannot be matched"
+                )
+            return texts
+        texts.update(zip(missing, ocr_pages))
+
+        if fingerprints is not None:
+            fingerprint_by_index = dict(zip(page_indexes, fingerprints))
+            for index, text in zip(missing, ocr_pages):
+                self.page_cache.put(fingerprint_by_index[index], text)
+        return texts
+
+    async def _ocr_pages(
+        self,
+        pdf_path: str,
+        page_indexes: List[int],
+        page_count: int,
+        on_page: Callable[[int, str], None],
+    ) -> List[str]:
+        """OCR выбранных страниц; если сканы - все страницы, отправляется исходный файл"""
+        if len(page_indexes) == page_count:
+            return await self.ocr_client.extract_pages(pdf_path, on_page)
+
+        fd, subset_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        try:
+            await self.engine.write_pages(pdf_path, page_indexes, subset_path)
+            return await self.ocr_client.extract_pages(subset_path, on_page)
+        except Exception as e:
+            logger.error(f"Could not prepare scanned pages of {pdf_path} for OCR: {e}")
+            return []
+        finally:
+            await asyncio.to_thread(os.remove, subset_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "documents_local_only": self.documents_local_only,
+            "documents_with_ocr": self.documents_with_ocr,
+            "text_layer_pages": self.text_layer_pages,
+            "ocr_pages": self.ocr_pages,
+            "ocr_failed_pages": self.ocr_failed_pages,
+            "cached_pages": self.cached_pages,
+            "page_cache": self.page_cache.stats() if self.page_cache is not None else None,
+        }
@@ -0,0 +1,215 @@
+"""
+Инкрементальный разбор JSON, приходящего по частям (ответы LLM, OCR сервиса)
+"""
+
+import json
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONObjectParser:
+    """
+    Разбирает JSON объект верхнего уровня по мере поступления текста
+
+    feed() возвращает поля объекта, значения которых уже полностью получены.
+    Текст до первой "{" (например, ```json) игнорируется.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = 0
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        """Весь полученный текст"""
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Добавляет очередную часть ответа и возвращает завершенные поля"""
+        self._buffer += chunk
+        fields: List[Tuple[str, Any]] = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer) and not self.done:
+            char = buffer[self._pos]
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._member_start = self._pos + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    fields.extend(self._parse_member(buffer[self._member_start:self._pos]))
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                fields.extend(self._parse_member(buffer[self._member_start:self._pos]))
+                self._member_start = self._pos + 1
+
+            self._pos += 1
+
+        return fields
+
+    @staticmethod
+    def _parse_member(segment: str) -> List[Tuple[str, Any]]:
+        segment = segment.strip()
+        if not segment:
+            return []
+        try:
+            return list(json.loads("{" + segment + "}").items())
+        except json.JSONDecodeError:
+            logger.debug(f"Could not parse streamed JSON member: {segment[:100]}")
+            return []
+
+
+class IncrementalJSONArrayParser:
+    """
+    Выдает элементы массива из поля key JSON объекта верхнего уровня по мере поступления
+
+    В памяти держится только текущий незавершенный элемент, поэтому большой ответ
+    (например, OCR многостраничного PDF) не буферизуется целиком.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._in_array = False
+        self._item_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Добавляет очередную часть ответа и возвращает завершенные элементы массива"""
+        self._buffer += chunk
+        items: List[Any] = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer) and not self.done:
+            char = buffer[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        self._last_string = self._loads(buffer[self._string_start:self._pos + 1])
+                        self._string_start = None
+                    elif self._in_array and self._depth == 2 and self._item_start is not None:
+                        items.extend(self._item(buffer[self._item_start:self._pos + 1]))
+                        self._item_start = None
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string_start = self._pos
+                elif self._in_array and self._depth == 2:
+                    self._item_start = self._pos
+            elif char == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif char == "," and self._depth == 1:
+                self._current_key = None
+            elif char in "{[":
+                if self._in_array and self._depth == 2:
+                    self._item_start = self._pos
+                elif char == "[" and self._depth == 1 and self._current_key == self.key:
+                    self._in_array = True
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._in_array and self._depth == 2 and self._item_start is not None:
+                    items.extend(self._item(buffer[self._item_start:self._pos + 1]))
+                    self._item_start = None
+                elif self._in_array and self._depth == 1:
+                    self.done = True
+
+            self._pos += 1
+
+        # Отбрасываем уже разобранный текст
+        starts = [start for start in (self._item_start, self._string_start) if start is not None]
+        keep_from = min(starts) if starts else self._pos
+        if keep_from:
+            self._buffer = buffer[keep_from:]
+            self._pos -= keep_from
+            if self._item_start is not None:
+                self._item_start -= keep_from
+            if self._string_start is not None:
+                self._string_start -= keep_from
+
+        return items
+
+    @staticmethod
+    def _loads(segment: str) -> Any:
+        try:
+            return json.loads(segment)
+        except json.JSONDecodeError:
+            logger.debug(f"Could not parse streamed JSON value: {segment[:100]}")
+            return None
+
+    def _item(self, segment: str) -> List[Any]:
+        value = self._loads(segment)
+        return [] if value is None else [value]
+
+
+class NDJSONParser:
+    """
+    Выдает объекты NDJSON потока (один JSON на строку) по мере поступления строк
+
+    В памяти держится только незавершенная последняя строка.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Добавляет очередную часть потока и возвращает объекты завершенных строк"""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        return self._parse(lines)
+
+    def close(self) -> List[Any]:
+        """Разбирает последнюю строку, если поток не закончился переводом строки"""
+        lines, self._buffer = [self._buffer], ""
+        self.done = True
+        return self._parse(lines)
+
+    @staticmethod
+    def _parse(lines: List[str]) -> List[Any]:
+        items = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.debug(f"Could not parse NDJSON line: {line[:100]}")
+        return items
@@ -0,0 +1,253 @@
+"""
+Бэкенды LLM для AIService: OpenRouter и асинхронная симуляция для нагрузочного тестирования
+"""
+
+import asyncio
+import json
+import logging
+import math
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from app.core.config import settings
+from app.services.request_scheduler import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackendError(Exception):
+    """Ошибка upstream LLM с HTTP статусом (для решения о повторе)"""
+
+    def __init__(self, status: int, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(f"LLM backend error {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500
+
+
+class LLMBackend:
+    """Интерфейс бэкенда: ответ в формате chat/completions OpenRouter"""
+
+    # Симулированные ответы не содержат реального анализа
+    simulated: bool = False
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class OpenRouterBackend(LLMBackend):
+    """Реальный провайдер: OpenRouter chat/completions через общий пул соединений"""
+
+    def __init__(self, api_key: str, base_url: str = "openrouter.ai"):
+        self.url = f"https://{base_url}/api/v1/chat/completions"
+        self.headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'HTTP-Referer': 'http://localhost:8000',  # Для OpenRouter
+            'X-Title': 'VTB Mortech HR System'
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+
+    async def start(self):
+        """Создает общий HTTP клиент с пулом keep-alive соединений"""
+        async with self._session_lock:
+            if self._session is not None and not self._session.closed:
+                return
+            connector = aiohttp.TCPConnector(
+                limit=settings.ai_http_limit,
+                limit_per_host=settings.ai_http_limit_per_host,
+                ttl_dns_cache=settings.ai_http_dns_ttl,
+                keepalive_timeout=settings.ai_http_keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=settings.ai_http_request_timeout,
+                sock_connect=settings.ai_http_connect_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers=self.headers,
+            )
+
+    async def close(self):
+        """Закрывает HTTP клиент и все соединения пула"""
+        async with self._session_lock:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общий HTTP клиент, создавая его при первом обращении"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        session = await self._get_session()
+        async with session.post(self.url, json=payload) as response:
+            if response.status != 200:
+                raise LLMBackendError(
+                    response.status,
+                    await response.text(),
+                    parse_retry_after(response.headers.get("Retry-After")),
+                )
+            return await response.json()
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        session = await self._get_session()
+        async with session.post(self.url, json={**payload, "stream": True}) as response:
+            if response.status != 200:
+                raise LLMBackendError(
+                    response.status,
+                    await response.text(),
+                    parse_retry_after(response.headers.get("Retry-After")),
+                )
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                # Пустые строки разделяют события, строки с ":" - комментарии keep-alive
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                choices = event.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+
+class SimulatedBackend(LLMBackend):
+    """
+    Асинхронная симуляция LLM без сети
+
+    Задержка: "fixed" (latency_ms) или "lognormal" (медиана latency_ms, разброс sigma),
+    с вероятностью tail_probability умножается на tail_multiplier (хвостовые выбросы).
+    С вероятностью error_rate возвращает 500, с вероятностью throttle_rate - 429.
+    """
+
+    simulated = True
+
+    def __init__(
+        self,
+        latency_distribution: str = "fixed",
+        latency_ms: float = 500.0,
+        latency_sigma: float = 0.5,
+        tail_probability: float = 0.0,
+        tail_multiplier: float = 10.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        completion_tokens: int = 150,
+        seed: Optional[int] = None,
+    ):
+        if latency_distribution not in ("fixed", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_distribution = latency_distribution
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tail_probability = tail_probability
+        self.tail_multiplier = tail_multiplier
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.completion_tokens = completion_tokens
+        self._random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """Задержка одного ответа в секундах"""
+        if self.latency_distribution == "lognormal":
+            latency = self._random.lognormvariate(math.log(max(self.latency_ms, 1e-3)), self.latency_sigma)
+        else:
+            latency = self.latency_ms
+        if self.tail_probability and self._random.random() < self.tail_probability:
+            latency *= self.tail_multiplier
+        return latency / 1000.0
+
+    def _inject_error(self):
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            raise LLMBackendError(429, "simulated rate limit", self.retry_after)
+        if roll < self.throttle_rate + self.error_rate:
+            raise LLMBackendError(500, "simulated upstream error")
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(self.sample_latency())
+        self._inject_error()
+
+        messages = payload.get("messages") or []
+        last_message = messages[-1]["content"] if messages else "Test message"
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        return {
+            "choices": [{
+                "message": {
+                    "content": f"Mock AI response to: {last_message[:100]}..."
+                }
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": prompt_tokens + self.completion_tokens,
+            },
+            "mock": True
+        }
+
+    async def stream_text(self, content: str, chunk_size: int = 40) -> AsyncIterator[str]:
+        """Отдает заданный текст по частям, распределяя выбранную задержку между частями"""
+        chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)] or [""]
+        delay = self.sample_latency() / len(chunks)
+        self._inject_error()
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        messages = payload.get("messages") or []
+        last_message = messages[-1]["content"] if messages else "Test message"
+        async for chunk in self.stream_text(f"Mock AI response to: {last_message[:100]}..."):
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "latency_distribution": self.latency_distribution,
+            "latency_ms": self.latency_ms,
+            "tail_probability": self.tail_probability,
+            "error_rate": self.error_rate,
+            "throttle_rate": self.throttle_rate,
+        }
+
+
+def create_llm_backend(api_key: str, base_url: str = "openrouter.ai") -> LLMBackend:
+    """Создает бэкенд по settings.ai_backend ("auto", "openrouter", "simulated")"""
+    backend = settings.ai_backend
+    if backend == "auto":
+        backend = "openrouter" if api_key and api_key != "test" else "simulated"
+    if backend == "openrouter":
+        return OpenRouterBackend(api_key, base_url)
+    if backend == "simulated":
+        return SimulatedBackend(
+            latency_distribution=settings.ai_sim_latency_distribution,
+            latency_ms=settings.ai_sim_latency_ms,
+            latency_sigma=settings.ai_sim_latency_sigma,
+            tail_probability=settings.ai_sim_tail_probability,
+            tail_multiplier=settings.ai_sim_tail_multiplier,
+            error_rate=settings.ai_sim_error_rate,
+            throttle_rate=settings.ai_sim_throttle_rate,
+            completion_tokens=settings.ai_sim_completion_tokens,
+        )
+    raise ValueError(f"Unknown AI backend: {settings.ai_backend}")
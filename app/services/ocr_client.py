@@ -0,0 +1,441 @@
+"""
+HTTP клиент OCR микросервиса: потоковая загрузка PDF и постраничный разбор ответа
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from app.core.config import settings
+from app.services.circuit_breaker import CLOSED, OPEN, CircuitBreaker, CircuitOpenError
+from app.services.json_stream import IncrementalJSONArrayParser, NDJSONParser
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
+
+
+class OCRServiceError(Exception):
+    """Ошибка ответа OCR сервиса"""
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"OCR service error {status}: {message}")
+        self.status = status
+
+
+class OCREndpoint:
+    """Экземпляр OCR сервиса: запросы в работе, собственный breaker и окно задержек"""
+
+    def __init__(self, url: str, breaker: CircuitBreaker, latency_window: int = 100):
+        self.url = url.rstrip("/")
+        self.breaker = breaker
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+
+    @property
+    def ejected(self) -> bool:
+        """Разомкнутый breaker - экземпляр исключен из балансировки до пробного запроса"""
+        return self.breaker.state == OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_p50": _percentile(self.latencies, 0.5),
+            "latency_p95": _percentile(self.latencies, 0.95),
+            "circuit": self.breaker.stats(),
+        }
+
+
+def _percentile(values: Iterable[float], q: float) -> Optional[float]:
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+class _PageStream:
+    """Страницы одного запроса к экземпляру сервиса по мере получения"""
+
+    def __init__(self, endpoint: OCREndpoint):
+        self.endpoint = endpoint
+        self.pages: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class OCRClient:
+    """
+    Клиент OCR сервиса с общим пулом соединений
+
+    PDF читается с диска частями в отдельном потоке и отправляется как тело
+    multipart запроса, ответ разбирается по страницам по мере получения -
+    ни файл, ни весь JSON ответа не держатся в памяти целиком. В облегченном
+    режиме (ocr_lean_mode) запрашивается только текст страниц потоком NDJSON.
+
+    При нескольких репликах сервиса каждый запрос уходит на экземпляр с
+    наименьшим числом запросов в работе. Экземпляр, ответивший ошибками
+    подряд, исключается своим breaker. Если документ обрабатывается дольше
+    ocr_hedge_percentile недавних запросов, тот же документ отправляется на
+    вторую реплику, и каждая страница берется из ответа, в котором она пришла раньше.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        failure_threshold: int = 3,
+        recovery_timeout: float = 60.0,
+    ):
+        if not base_urls:
+            raise ValueError("At least one OCR service URL is required")
+        self.endpoints = [
+            OCREndpoint(
+                url,
+                CircuitBreaker(f"ocr:{url}", failure_threshold=failure_threshold, recovery_timeout=recovery_timeout),
+                latency_window=settings.ocr_latency_window,
+            )
+            for url in base_urls
+        ]
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        self._latencies: Deque[float] = deque(maxlen=settings.ocr_latency_window)
+        self.requests = 0
+        self.pages = 0
+        self.bytes_sent = 0
+        self.streamed_responses = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retries = 0
+
+    async def start(self):
+        """Создает общий HTTP клиент с пулом keep-alive соединений"""
+        async with self._session_lock:
+            if self._session is not None and not self._session.closed:
+                return
+            connector = aiohttp.TCPConnector(
+                limit=settings.ocr_http_limit,
+                keepalive_timeout=settings.ocr_http_keepalive_timeout,
+            )
+            # Без общего таймаута: большой PDF распознается долго, но соединение
+            # и каждое чтение ответа ограничены отдельно
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=settings.ocr_connect_timeout,
+                sock_read=settings.ocr_read_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        """Закрывает HTTP клиент и все соединения пула"""
+        async with self._session_lock:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def _file_chunks(self, file) -> AsyncIterator[bytes]:
+        """Читает открытый файл частями, не блокируя event loop"""
+        try:
+            while True:
+                chunk = await asyncio.to_thread(file.read, settings.ocr_upload_chunk_size)
+                if not chunk:
+                    return
+                self.bytes_sent += len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+
+    def _pick_endpoint(self, exclude: Optional[OCREndpoint] = None) -> OCREndpoint:
+        """
+        Экземпляр с наименьшим числом запросов в работе среди неисключенных
+
+        CircuitOpenError - все экземпляры исключены.
+        """
+        candidates = [endpoint for endpoint in self.endpoints if endpoint is not exclude]
+        # Случайный порядок при равной загрузке, чтобы не нагружать первую реплику
+        random.shuffle(candidates)
+        candidates.sort(key=lambda endpoint: (endpoint.ejected, endpoint.outstanding))
+        error: Optional[CircuitOpenError] = None
+        for endpoint in candidates:
+            try:
+                endpoint.breaker.before_call()
+                return endpoint
+            except CircuitOpenError as e:
+                error = e
+        raise error or CircuitOpenError("ocr", 0.0)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Через сколько секунд дублировать запрос; None - недостаточно статистики"""
+        if len(self.endpoints) < 2 or len(self._latencies) < settings.ocr_hedge_min_samples:
+            return None
+        return max(settings.ocr_hedge_min_delay, _percentile(self._latencies, settings.ocr_hedge_percentile))
+
+    @staticmethod
+    def _page_parser(content_type: str):
+        """NDJSON - по странице на строку (облегченный режим), иначе массив страниц в JSON ответе"""
+        if content_type in NDJSON_CONTENT_TYPES:
+            return NDJSONParser()
+        return IncrementalJSONArrayParser("extracted_text")
+
+    @staticmethod
+    def _page_text(page: Any) -> Optional[str]:
+        if isinstance(page, dict):
+            # В NDJSON потоке, кроме страниц, может быть итоговая строка без текста
+            text = page.get("text")
+            return text if isinstance(text, str) else None
+        return str(page)
+
+    async def _iter_endpoint_pages(self, endpoint: OCREndpoint, pdf_path: str) -> AsyncIterator[str]:
+        """
+        Текст страниц PDF от выбранного экземпляра по мере получения ответа
+        (breaker.before_call уже вызван)
+
+        OSError - файл не прочитан (breaker не затрагивает), OCRServiceError
+        и ошибки сети - сбой экземпляра.
+        """
+        file = await asyncio.to_thread(open, pdf_path, "rb")
+
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        self.requests += 1
+        started = time.monotonic()
+        params, headers = {}, {}
+        if settings.ocr_lean_mode:
+            # Координаты блоков текста анализу не нужны; сервис без поддержки
+            # облегченного режима параметры игнорирует и отвечает обычным JSON
+            params["fields"] = "text"
+            headers["Accept"] = "application/x-ndjson, application/json;q=0.9"
+        try:
+            session = await self._get_session()
+            data = aiohttp.FormData()
+            data.add_field(
+                "file",
+                self._file_chunks(file),
+                filename=os.path.basename(pdf_path),
+                content_type="application/pdf",
+            )
+            async with session.post(
+                f"{endpoint.url}/ocr/process-pdf", data=data, params=params, headers=headers
+            ) as resp:
+                if resp.status != 200:
+                    message = await resp.text()
+                    # 4xx - проблема запроса (например, битый PDF), а не сервиса
+                    if resp.status >= 500:
+                        endpoint.failures += 1
+                        endpoint.breaker.record_failure()
+                    else:
+                        endpoint.breaker.record_success()
+                    raise OCRServiceError(resp.status, message)
+
+                if resp.content_type in NDJSON_CONTENT_TYPES:
+                    self.streamed_responses += 1
+                parser = self._page_parser(resp.content_type)
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                async for chunk in resp.content.iter_chunked(settings.ocr_download_chunk_size):
+                    # После массива страниц остаток ответа только дочитываем,
+                    # чтобы соединение вернулось в пул
+                    if parser.done:
+                        continue
+                    for page in parser.feed(decoder.decode(chunk)):
+                        text = self._page_text(page)
+                        if text is not None:
+                            self.pages += 1
+                            yield text
+                if isinstance(parser, NDJSONParser):
+                    for page in parser.feed(decoder.decode(b"", final=True)) + parser.close():
+                        text = self._page_text(page)
+                        if text is not None:
+                            self.pages += 1
+                            yield text
+
+            latency = time.monotonic() - started
+            endpoint.latencies.append(latency)
+            self._latencies.append(latency)
+            endpoint.breaker.record_success()
+        except (OCRServiceError, asyncio.CancelledError, GeneratorExit):
+            raise
+        except Exception:
+            endpoint.failures += 1
+            endpoint.breaker.record_failure()
+            raise
+        finally:
+            endpoint.outstanding -= 1
+            # Если запрос не дошел до чтения файла, закрываем его здесь
+            if not file.closed:
+                await asyncio.to_thread(file.close)
+
+    async def _fill(self, stream: "_PageStream", pdf_path: str, changed: asyncio.Event):
+        """Складывает страницы запроса в stream по мере получения"""
+        try:
+            async for page in self._iter_endpoint_pages(stream.endpoint, pdf_path):
+                stream.pages.append(page)
+                changed.set()
+            stream.done = True
+        except Exception as e:
+            stream.error = e
+        finally:
+            changed.set()
+
+    def _start_stream(self, endpoint: OCREndpoint, pdf_path: str, changed: asyncio.Event) -> "_PageStream":
+        stream = _PageStream(endpoint)
+        stream.task = asyncio.create_task(self._fill(stream, pdf_path, changed))
+        return stream
+
+    @staticmethod
+    def _retryable(error: BaseException) -> bool:
+        """Сбой экземпляра (сеть, 5xx), а не запроса или файла - имеет смысл другая реплика"""
+        if isinstance(error, OCRServiceError):
+            return error.status >= 500
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def iter_pages(self, pdf_path: str) -> AsyncIterator[str]:
+        """
+        Текст страниц PDF по мере распознавания - с балансировкой, дублированием
+        долгих запросов и одной повторной попыткой на другом экземпляре при его сбое
+
+        При дублировании или повторе очередная страница берется из того запроса,
+        который получил ее первым; уже выданные страницы не повторяются, поэтому
+        сбой экземпляра посреди ответа тоже продолжается на другом.
+        CircuitOpenError - все экземпляры исключены, иначе ошибка запроса
+        (при дублировании или повторе - последняя из двух).
+        """
+        changed = asyncio.Event()
+        primary = self._start_stream(self._pick_endpoint(), pdf_path, changed)
+        streams = [primary]
+        # Второй запрос на другой экземпляр: дублирующий (hedged) или повторный
+        backup: Optional[_PageStream] = None
+        hedged = False
+        delay = self._hedge_delay()
+        hedge_at = time.monotonic() + delay if delay is not None else None
+        yielded = 0
+        try:
+            while True:
+                changed.clear()
+                ahead = next((stream for stream in streams if len(stream.pages) > yielded), None)
+                if ahead is not None:
+                    yielded += 1
+                    yield ahead.pages[yielded - 1]
+                    continue
+
+                finished = next((stream for stream in streams if stream.done), None)
+                if finished is not None:
+                    if hedged and finished is backup:
+                        self.hedge_wins += 1
+                    return
+
+                if all(stream.error is not None for stream in streams):
+                    error = streams[-1].error
+                    if backup is None and self._retryable(error):
+                        backup = self._start_backup(primary.endpoint, pdf_path, changed, f"failed ({error}), retrying")
+                        if backup is not None:
+                            self.retries += 1
+                            streams.append(backup)
+                            continue
+                    raise error
+
+                timeout = None
+                if backup is None and hedge_at is not None:
+                    timeout = hedge_at - time.monotonic()
+                    if timeout <= 0:
+                        hedge_at = None
+                        backup = self._start_backup(primary.endpoint, pdf_path, changed, f"exceeded {delay:.1f}s, hedging")
+                        if backup is not None:
+                            hedged = True
+                            self.hedged += 1
+                            streams.append(backup)
+                        continue
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for stream in streams:
+                if not stream.task.done():
+                    stream.task.cancel()
+
+    async def fetch_pages(self, pdf_path: str) -> List[str]:
+        """Текст всех страниц PDF (см. iter_pages)"""
+        return [page async for page in self.iter_pages(pdf_path)]
+
+    def _start_backup(
+        self,
+        primary: OCREndpoint,
+        pdf_path: str,
+        changed: asyncio.Event,
+        reason: str,
+    ) -> Optional["_PageStream"]:
+        """Отправляет документ на другой экземпляр, если есть доступный"""
+        try:
+            secondary = self._pick_endpoint(exclude=primary)
+        except CircuitOpenError:
+            return None
+        logger.info(f"OCR of {pdf_path} on {primary.url} {reason} on {secondary.url}")
+        return self._start_stream(secondary, pdf_path, changed)
+
+    def circuit_state(self) -> str:
+        """Общее состояние: open - исключены все экземпляры, closed - ни один, иначе degraded"""
+        states = [endpoint.breaker.state for endpoint in self.endpoints]
+        if all(state == OPEN for state in states):
+            return OPEN
+        if all(state == CLOSED for state in states):
+            return CLOSED
+        return "degraded"
+
+    async def extract_pages(
+        self,
+        pdf_path: str,
+        on_page: Optional[Callable[[int, str], None]] = None,
+    ) -> List[str]:
+        """
+        Текст всех страниц PDF; при недоступности сервиса или ошибке - пустой список
+
+        on_page(номер, текст) вызывается для каждой страницы сразу после получения,
+        пока следующие еще распознаются.
+        """
+        pages: List[str] = []
+        try:
+            async for page in self.iter_pages(pdf_path):
+                if on_page is not None:
+                    on_page(len(pages), page)
+                pages.append(page)
+            return pages
+        except CircuitOpenError as e:
+            logger.warning(f"OCR service unavailable: {e}")
+        except OCRServiceError as e:
+            logger.error(str(e))
+        except aiohttp.ClientError as e:
+            logger.error(f"Error in OCR microservice call: {e}")
+        except OSError as e:
+            logger.error(f"Could not read resume file {pdf_path}: {e}")
+        except Exception as e:
+            logger.error(f"Error in OCR microservice call: {e}")
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "pages": self.pages,
+            "bytes_sent": self.bytes_sent,
+            "streamed_responses": self.streamed_responses,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "hedge_delay": self._hedge_delay(),
+            "endpoints": [endpoint.stats() for endpoint in self.endpoints],
+        }
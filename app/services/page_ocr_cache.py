@@ -0,0 +1,75 @@
+"""
+Кэш результатов OCR отдельных страниц PDF, адресуемый хэшем содержимого страницы
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PageOCRCache:
+    """
+    In-memory LRU текста распознанных страниц
+
+    Резюме часто собраны из одинаковых шаблонных страниц, а повторно
+    загруженная версия отличается от предыдущей одной-двумя страницами.
+    Ключ - хэш содержимого страницы (см. PDFService.page_fingerprints), поэтому
+    совпадающие страницы разных файлов распознаются один раз. Размер кэша
+    ограничен суммарным объемом хранимого текста, а не числом записей:
+    страница скана может содержать как пару строк, так и плотную таблицу.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key: str, text: str) -> int:
+        return len(key) + len(text.encode("utf-8"))
+
+    def get(self, key: str) -> Optional[str]:
+        """Текст страницы или None, если страница еще не распознавалась"""
+        text = self._entries.get(key)
+        if text is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return text
+
+    def put(self, key: str, text: str):
+        """Сохраняет текст страницы, вытесняя давно не использованные записи"""
+        size = self._entry_size(key, text)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= self._entry_size(key, previous)
+        self._entries[key] = text
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, old_text = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(old_key, old_text)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
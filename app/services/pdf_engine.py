@@ -0,0 +1,281 @@
+"""
+Асинхронный фасад над PDFService: разбор PDF в отдельных процессах
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.services.pdf_service import PDFService
+
+logger = logging.getLogger(__name__)
+
+
+# Сколько ждать запуска нового процесса разбора
+WORKER_STARTUP_TIMEOUT = 60.0
+
+
+class PDFExtractionTimeout(Exception):
+    """Разбор PDF не уложился в pdf_engine_timeout"""
+
+
+class PDFWorkerCrashed(Exception):
+    """Процесс разбора PDF завершился, не вернув результат"""
+
+
+def _worker_main(conn: Connection):
+    """Цикл процесса разбора: (func, args) -> (ok, результат или исключение); None - выход"""
+    # Модули уже импортированы - сообщаем о готовности
+    conn.send((True, None))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func, args = task
+        try:
+            reply = (True, func(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Исключение или результат не сериализуются - передаем текст ошибки
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _PDFWorker:
+    """Процесс разбора PDF с каналом для задач"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    async def call(self, func: Callable, args: tuple, timeout: float) -> Any:
+        """
+        Выполняет задачу в процессе; таймаут отсчитывается с момента передачи
+        задачи свободному процессу
+
+        asyncio.TimeoutError - процесс не ответил вовремя (он продолжает разбор,
+        его нужно завершить), PDFWorkerCrashed - процесс упал.
+        """
+        self.tasks += 1
+        try:
+            self.conn.send((func, args))
+        except OSError as e:
+            raise PDFWorkerCrashed(f"PDF worker {self.process.pid} exited: {e}") from e
+        return await self.reply(timeout)
+
+    async def reply(self, timeout: float) -> Any:
+        """Ждет ответ процесса, не блокируя event loop"""
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, readable.set)
+        try:
+            await asyncio.wait_for(readable.wait(), timeout=timeout)
+        finally:
+            loop.remove_reader(fd)
+        try:
+            ok, value = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise PDFWorkerCrashed(f"PDF worker {self.process.pid} exited: {e}") from e
+        if ok:
+            return value
+        raise value
+
+    def stop(self):
+        """Просит процесс завершиться после текущей задачи"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.conn.close()
+
+
+class PDFExtractionEngine:
+    """
+    pdfplumber/PyPDF2 - синхронный код, нагружающий CPU. В event loop он блокировал
+    бы весь воркер uvicorn, а в потоках упирается в GIL, поэтому разбор идет
+    в отдельных процессах:
+
+    - процессов не больше pdf_engine_workers, задачи ждут свободный процесс
+      на семафоре;
+    - процесс перезапускается после pdf_engine_max_tasks_per_child задач,
+      чтобы не копилась память pdfplumber;
+    - задача выполняется не дольше pdf_engine_timeout с момента, когда ее взял
+      процесс (ожидание в очереди не считается); зависший процесс завершается,
+      остальные задачи продолжают работу;
+    - разбираются не более pdf_max_pages страниц, большие PDF делятся на части
+      по pdf_pages_per_chunk страниц, которые обрабатываются параллельно.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_tasks_per_child: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.max_workers = max_workers or settings.pdf_engine_workers
+        self.max_tasks_per_child = max_tasks_per_child or settings.pdf_engine_max_tasks_per_child
+        self.timeout = timeout or settings.pdf_engine_timeout
+        # spawn, а не fork: процесс API многопоточный (event loop, пулы потоков)
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: List[_PDFWorker] = []
+        self._workers: Set[_PDFWorker] = set()
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self.documents = 0
+        self.chunks = 0
+        self.timeouts = 0
+        self.truncated = 0
+        self.workers_killed = 0
+
+    async def _acquire_worker(self) -> _PDFWorker:
+        if self._idle:
+            return self._idle.pop()
+        worker = await asyncio.to_thread(_PDFWorker, self._context)
+        self._workers.add(worker)
+        try:
+            # Запуск процесса (импорт pdfplumber) не входит в таймаут задачи
+            await worker.reply(WORKER_STARTUP_TIMEOUT)
+        except BaseException:
+            await asyncio.shield(self._kill_worker(worker))
+            raise
+        return worker
+
+    def _release_worker(self, worker: _PDFWorker):
+        if worker.tasks >= self.max_tasks_per_child:
+            self._workers.discard(worker)
+            worker.stop()
+        else:
+            self._idle.append(worker)
+
+    async def _kill_worker(self, worker: _PDFWorker):
+        self._workers.discard(worker)
+        self.workers_killed += 1
+        worker.kill()
+        await asyncio.to_thread(worker.process.join, 5)
+
+    async def close(self):
+        """Останавливает процессы разбора"""
+        workers, self._workers, self._idle = list(self._workers), set(), []
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.kill()
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """
+        Выполняет функцию в свободном процессе; если процесс упал - одна
+        повторная попытка в новом
+
+        Зависший (PDFExtractionTimeout) или отмененный разбор завершается вместе
+        со своим процессом, на другие задачи это не влияет.
+        """
+        async with self._slots:
+            for attempt in range(2):
+                worker = await self._acquire_worker()
+                try:
+                    result = await worker.call(func, args, self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    # Процесс продолжает разбор и после отмены ожидания - завершаем его
+                    logger.error(f"PDF extraction of {args[0]} timed out after {self.timeout}s")
+                    await asyncio.shield(self._kill_worker(worker))
+                    raise PDFExtractionTimeout(args[0])
+                except PDFWorkerCrashed:
+                    await self._kill_worker(worker)
+                    if attempt:
+                        raise
+                    logger.warning("PDF worker process crashed, retrying in a new one")
+                    continue
+                except asyncio.CancelledError:
+                    # Результат больше не нужен, а процесс занят разбором
+                    await asyncio.shield(self._kill_worker(worker))
+                    raise
+                except BaseException:
+                    # Ошибка самого разбора (исключение из PDFService) - процесс исправен
+                    self._release_worker(worker)
+                    raise
+                self._release_worker(worker)
+                return result
+
+    async def get_page_count(self, pdf_path: str) -> int:
+        return await self._run(PDFService.get_page_count, pdf_path)
+
+    async def extract_pages_text_layer(self, pdf_path: str) -> List[str]:
+        """Текстовый слой страниц PDF (см. PDFService.extract_pages_text_layer)"""
+        self.documents += 1
+        return await self._extract_pages(pdf_path)
+
+    async def _extract_pages(self, pdf_path: str) -> List[str]:
+        try:
+            page_count = await self._run(PDFService.get_page_count, pdf_path)
+        except Exception as e:
+            # Не открылся PyPDF2 - пусть PDFService попробует pdfplumber целиком
+            logger.warning(f"Could not count pages of {pdf_path}: {e}")
+            return await self._run(PDFService.extract_pages_text_layer, pdf_path, 0, settings.pdf_max_pages)
+
+        if page_count > settings.pdf_max_pages:
+            self.truncated += 1
+            logger.warning(f"{pdf_path} has {page_count} pages, only first {settings.pdf_max_pages} are extracted")
+            page_count = settings.pdf_max_pages
+
+        chunk = max(1, settings.pdf_pages_per_chunk)
+        ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+        self.chunks += len(ranges)
+        parts = await asyncio.gather(*(
+            self._run(PDFService.extract_pages_text_layer, pdf_path, start, end)
+            for start, end in ranges
+        ))
+        return [page for part in parts for page in part]
+
+    async def extract_text(self, pdf_path: str) -> str:
+        """Текст PDF целиком (см. PDFService.extract_text_from_pdf)"""
+        self.documents += 1
+        return await self._run(PDFService.extract_text_from_pdf, pdf_path)
+
+    async def page_fingerprints(self, pdf_path: str, page_indexes: List[int]) -> List[str]:
+        """Хэши содержимого страниц PDF (см. PDFService.page_fingerprints)"""
+        return await self._run(PDFService.page_fingerprints, pdf_path, page_indexes)
+
+    async def write_pages(self, pdf_path: str, page_indexes: List[int], output_path: str):
+        """Сохраняет выбранные страницы PDF в отдельный файл"""
+        await self._run(PDFService.write_pages, pdf_path, page_indexes, output_path)
+
+    async def inspect_pdf(self, pdf_path: str, stop_early: bool = False) -> Dict[str, Any]:
+        """Разбор PDF за один проход (см. PDFService.inspect_pdf)"""
+        self.documents += 1
+        return await self._run(PDFService.inspect_pdf, pdf_path, stop_early)
+
+    async def get_pdf_info(self, pdf_path: str) -> Dict[str, Any]:
+        """Информация о PDF (см. PDFService.get_pdf_info)"""
+        return await self._run(PDFService.get_pdf_info, pdf_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "timeouts": self.timeouts,
+            "truncated": self.truncated,
+            "workers_killed": self.workers_killed,
+        }
+
+
+# Глобальный экземпляр движка (процессы создаются при первом разборе)
+pdf_engine = PDFExtractionEngine()
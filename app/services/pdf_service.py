@@ -2,10 +2,12 @@
 Сервис для парсинга PDF резюме
 """
 
+import hashlib
 import PyPDF2
 import pdfplumber
 import logging
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -13,97 +15,197 @@ logger = logging.getLogger(__name__)
 class PDFService:
     """Сервис для извлечения текста из PDF файлов"""
     
+    # Минимум символов, при котором извлечение текста считается успешным
+    MIN_TEXT_CHARS = 50
+    
     @staticmethod
     def extract_text_from_pdf(pdf_path: str) -> str:
         """
         Извлекает текст из PDF файла
         """
-        try:
-            # Пробуем сначала pdfplumber (лучше для таблиц и сложной верстки)
-            text = PDFService._extract_with_pdfplumber(pdf_path)
-            if text and len(text.strip()) > 50:  # Если получили достаточно текста
-                return text
-            
-            # Если pdfplumber не сработал, пробуем PyPDF2
-            text = PDFService._extract_with_pypdf2(pdf_path)
-            if text and len(text.strip()) > 50:
-                return text
-            
+        inspection = PDFService.inspect_pdf(pdf_path)
+        if not inspection["extraction_successful"]:
             logger.warning(f"Could not extract meaningful text from PDF: {pdf_path}")
             return ""
+        return "\n".join(page for page in inspection["pages"] if page)
+    
+    @staticmethod
+    def _read_pages(pages, stop_after_chars: Optional[int]) -> List[str]:
+        """
+        Текстовый слой страниц; при stop_after_chars чтение прекращается,
+        как только набрано столько символов
+        """
+        texts = []
+        total = 0
+        for page in pages:
+            text = (page.extract_text() or "").strip()
+            texts.append(text)
+            total += len(text)
+            if stop_after_chars is not None and total > stop_after_chars:
+                break
+        return texts
+    
+    @staticmethod
+    def inspect_pdf(pdf_path: str, stop_early: bool = False) -> Dict[str, Any]:
+        """
+        Разбор PDF за один проход: количество страниц, наличие текстового слоя
+        по страницам, текст страниц и время каждого этапа
+        
+        Документ открывается pdfplumber один раз; PyPDF2 используется, только если
+        pdfplumber не открыл файл или не нашел достаточно текста. В "backend"
+        указывается библиотека, давшая результат.
+        
+        stop_early - нужен только ответ "есть ли текст": чтение страниц
+        прекращается, как только набрано MIN_TEXT_CHARS символов, и "pages"
+        содержит лишь прочитанные страницы.
+        """
+        started = time.perf_counter()
+        stop_after_chars = PDFService.MIN_TEXT_CHARS if stop_early else None
+        result = {
+            "file_size": 0,
+            "page_count": 0,
+            "pages": [],
+            "pages_with_text": [],
+            "pages_read": 0,
+            "backend": None,
+            "has_text": False,
+            "extraction_successful": False,
+            "timings": {},
+        }
+        
+        file_path = Path(pdf_path)
+        if file_path.exists():
+            result["file_size"] = file_path.stat().st_size
+        
+        backends = (
+            ("pdfplumber", lambda: pdfplumber.open(pdf_path), lambda pdf: pdf.pages),
+            ("pypdf2", lambda: open(pdf_path, 'rb'), lambda file: PyPDF2.PdfReader(file).pages),
+        )
+        for backend, open_document, get_pages in backends:
+            backend_started = time.perf_counter()
+            try:
+                with open_document() as document:
+                    pages = get_pages(document)
+                    texts = PDFService._read_pages(pages, stop_after_chars)
+                    page_count = len(pages)
+            except Exception as e:
+                logger.warning(f"{backend} extraction failed: {e}")
+                continue
+            finally:
+                result["timings"][f"{backend}_ms"] = round((time.perf_counter() - backend_started) * 1000, 1)
             
-        except Exception as e:
-            logger.error(f"Error extracting text from PDF {pdf_path}: {e}")
-            return ""
+            text_chars = sum(len(text) for text in texts)
+            if text_chars > PDFService.MIN_TEXT_CHARS or result["backend"] is None:
+                result.update(
+                    page_count=page_count,
+                    pages=texts,
+                    pages_with_text=[bool(text) for text in texts],
+                    pages_read=len(texts),
+                    backend=backend,
+                    has_text=bool(texts and texts[0]),
+                    extraction_successful=text_chars > PDFService.MIN_TEXT_CHARS,
+                )
+            if result["extraction_successful"]:
+                break
+        
+        result["timings"]["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
     
     @staticmethod
-    def _extract_with_pdfplumber(pdf_path: str) -> str:
-        """Извлечение текста с помощью pdfplumber"""
+    def extract_pages_text_layer(pdf_path: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """
+        Извлекает текстовый слой страниц [start, end) (без OCR)
+
+        Для страниц без текстового слоя (сканы) возвращается пустая строка.
+        Если PDF не удалось открыть, возвращается пустой список.
+        """
         try:
-            text = ""
             with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return text.strip()
+                return [(page.extract_text() or "").strip() for page in pdf.pages[start:end]]
         except Exception as e:
-            logger.warning(f"pdfplumber extraction failed: {e}")
-            return ""
-    
-    @staticmethod
-    def _extract_with_pypdf2(pdf_path: str) -> str:
-        """Извлечение текста с помощью PyPDF2"""
+            logger.warning(f"pdfplumber page extraction failed: {e}")
+        
         try:
-            text = ""
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return text.strip()
+                return [(page.extract_text() or "").strip() for page in pdf_reader.pages[start:end]]
         except Exception as e:
-            logger.warning(f"PyPDF2 extraction failed: {e}")
-            return ""
+            logger.warning(f"PyPDF2 page extraction failed: {e}")
+            return []
+    
+    @staticmethod
+    def get_page_count(pdf_path: str) -> int:
+        """Количество страниц PDF (без разбора содержимого страниц)"""
+        with open(pdf_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    
+    @staticmethod
+    def _page_fingerprint(page) -> str:
+        """
+        Хэш содержимого страницы: поток команд отрисовки, изображения (в том числе
+        вложенные в Form XObject) и геометрия страницы. Одинаковые страницы разных
+        файлов (шаблоны, неизмененные страницы повторной загрузки) дают одинаковый хэш.
+        """
+        digest = hashlib.sha256()
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        digest.update(repr([float(value) for value in page.mediabox]).encode())
+        digest.update(str(page.get("/Rotate", 0)).encode())
+        # У скана поток команд обычно один и тот же ("нарисовать /Im0"),
+        # различаются сами изображения
+        PDFService._hash_xobjects(digest, page.get("/Resources"), set())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _hash_xobjects(digest, resources, seen: set):
+        """Добавляет в хэш данные XObject ресурсов; Form XObject обходятся рекурсивно"""
+        if resources is None:
+            return
+        xobjects = resources.get_object().get("/XObject")
+        if xobjects is None:
+            return
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            xobject = xobjects[name].get_object()
+            digest.update(name.encode())
+            # Одна форма может использоваться несколько раз или ссылаться сама на себя
+            if id(xobject) in seen:
+                digest.update(b"<seen>")
+                continue
+            seen.add(id(xobject))
+            digest.update(str(xobject.get("/Subtype")).encode())
+            digest.update(xobject.get_data())
+            if xobject.get("/Subtype") == "/Form":
+                PDFService._hash_xobjects(digest, xobject.get("/Resources"), seen)
+    
+    @staticmethod
+    def page_fingerprints(pdf_path: str, page_indexes: List[int]) -> List[str]:
+        """Хэши содержимого выбранных страниц PDF (индексы с 0)"""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            return [PDFService._page_fingerprint(pdf_reader.pages[index]) for index in page_indexes]
+    
+    @staticmethod
+    def write_pages(pdf_path: str, page_indexes: List[int], output_path: str):
+        """Сохраняет выбранные страницы PDF (индексы с 0) в отдельный файл"""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            pdf_writer = PyPDF2.PdfWriter()
+            for index in page_indexes:
+                pdf_writer.add_page(pdf_reader.pages[index])
+            with open(output_path, 'wb') as output:
+                pdf_writer.write(output)
     
     @staticmethod
     def get_pdf_info(pdf_path: str) -> Dict[str, Any]:
         """
-        Получает информацию о PDF файле
+        Получает информацию о PDF файле (без сохранения текста страниц)
         """
         try:
-            info = {
-                "file_size": 0,
-                "page_count": 0,
-                "has_text": False,
-                "extraction_successful": False
-            }
-            
-            # Размер файла
-            file_path = Path(pdf_path)
-            if file_path.exists():
-                info["file_size"] = file_path.stat().st_size
-            
-            # Количество страниц и проверка текста
-            try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    info["page_count"] = len(pdf.pages)
-                    
-                    # Проверяем первую страницу на наличие текста
-                    if pdf.pages:
-                        first_page_text = pdf.pages[0].extract_text()
-                        info["has_text"] = bool(first_page_text and first_page_text.strip())
-                        
-            except Exception as e:
-                logger.warning(f"Could not get PDF info: {e}")
-            
-            # Проверяем успешность извлечения
-            extracted_text = PDFService.extract_text_from_pdf(pdf_path)
-            info["extraction_successful"] = len(extracted_text.strip()) > 50
-            
+            info = PDFService.inspect_pdf(pdf_path, stop_early=True)
+            info.pop("pages")
             return info
-            
         except Exception as e:
             logger.error(f"Error getting PDF info: {e}")
             return {
@@ -0,0 +1,175 @@
+"""
+Адаптивный планировщик запросов к LLM (AIMD по параллелизму + token bucket)
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды или HTTP дата) в секунды ожидания"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не более capacity накоплено"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Ждет, пока в корзине не наберется amount токенов, и списывает их"""
+        if not self.enabled or amount <= 0:
+            return
+        # Запрос больше емкости корзины пропускаем при полной корзине, иначе он не пройдет никогда
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """Списывает (amount > 0) или возвращает (amount < 0) токены после фактического расхода"""
+        if not self.enabled:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class AdaptiveScheduler:
+    """
+    Ограничивает параллелизм и частоту запросов к LLM
+
+    Лимит параллелизма растет аддитивно на успешных ответах и уменьшается
+    мультипликативно на 429/5xx. Retry-After приостанавливает выдачу новых слотов.
+    """
+
+    def __init__(
+        self,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        requests_per_second: float = 0.0,
+        tokens_per_minute: float = 0.0,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 1.0,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self._limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self._in_flight = 0
+        self._queued = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+        self._requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self.completed = 0
+        self.throttled = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def _wait_pause(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0):
+        """Занимает слот параллелизма и квоту запросов/токенов на время запроса"""
+        self._queued += 1
+        try:
+            await self._wait_pause()
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._in_flight < self.limit)
+                self._in_flight += 1
+        finally:
+            self._queued -= 1
+
+        try:
+            await self._requests.acquire(1)
+            await self._tokens.acquire(estimated_tokens)
+            # Пауза могла начаться, пока ждали квоту
+            await self._wait_pause()
+            yield
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, token_correction: int = 0):
+        """Успешный ответ: аддитивно увеличивает лимит (~+1 за окно из limit запросов)"""
+        self.completed += 1
+        self._tokens.adjust(token_correction)
+        self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+
+    def on_overload(self, retry_after: Optional[float] = None):
+        """Ответ 429/5xx: мультипликативно уменьшает лимит и выдерживает Retry-After"""
+        self.throttled += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= self.decrease_cooldown:
+            self._limit = max(float(self.min_concurrency), self._limit * self.decrease_factor)
+            self._last_decrease = now
+            logger.warning(f"LLM upstream overloaded, concurrency limit reduced to {self.limit}")
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущее состояние планировщика"""
+        return {
+            "concurrency_limit": self.limit,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
@@ -3,22 +3,57 @@
 """
 
 import asyncio
+import hashlib
 import logging
-import os
-from typing import Dict, Any, Optional
+import time
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
-from app.services.ai_service import get_ai_service
+from app.core.config import settings
+from app.services.ai_service import EXTRACTION_PROMPT_VERSION, get_ai_service, parse_match_percentage
+from app.services.batch_progress import BatchProgress, batch_store
+from app.services.resume_preprocessing import ResumePreprocessor
+from app.services.resume_store import resume_store
+from app.services.hybrid_extractor import HybridTextExtractor
+from app.services.ocr_client import OCRClient
+from app.services.pdf_engine import pdf_engine
+from app.services.page_ocr_cache import PageOCRCache
+from app.services.single_flight import SingleFlight, fingerprint
+from app.services.stage_graph import Stage, StageGraph
 
+from app.db.session import AsyncSessionLocal
+from app.models.analysis_batch import AnalysisBatch
+from app.models.analysis_job import AnalysisJob
 from app.models.vacancy import Vacancy, VacancyApplication
 from app.models.user import User
+from sqlalchemy import or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-import aiohttp
-
 logger = logging.getLogger(__name__)
 
-OCR_SERVICE_URL = os.getenv("OCR_SERVICE_URL", "http://localhost:8001")
+# Одновременные OCR/LLM запросы с одинаковыми входными данными выполняются один раз
+ocr_flight = SingleFlight("ocr")
+ai_flight = SingleFlight("ai")
+
+ocr_client = OCRClient(
+    [url.strip() for url in settings.ocr_service_url.split(",") if url.strip()],
+    failure_threshold=settings.ocr_breaker_failure_threshold,
+    recovery_timeout=settings.ocr_breaker_recovery_timeout,
+)
+page_ocr_cache = (
+    PageOCRCache(max_bytes=settings.ocr_page_cache_max_bytes)
+    if settings.ocr_page_cache_enabled
+    else None
+)
+hybrid_extractor = HybridTextExtractor(ocr_client, pdf_engine, page_ocr_cache)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 class ResumeAnalysisService:
     """Сервис для полного анализа резюме"""
@@ -32,58 +67,340 @@ class ResumeAnalysisService:
     ) -> Dict[str, Any]:
         """
         Полный анализ заявки с резюме
+
+        Этапы (OCR, запросы к LLM) выполняются как граф: независимые запросы к LLM
+        идут параллельно, тайминги этапов возвращаются в "stage_timings"
         """
         try:
-            resume_text = await ResumeAnalysisService._extract_text_with_ocr(application.resume_file_path)
+            vacancy_requirements = ResumeAnalysisService._format_vacancy_requirements(vacancy)
+            file_hash = await ResumeAnalysisService._resume_sha256(application)
+            # Данные резюме не зависят от вакансии: если PDF уже разбирался, повторно не извлекаем
+            stored_resume_data = None
+            if file_hash:
+                stored_resume_data = await resume_store.get_resume_data(file_hash, EXTRACTION_PROMPT_VERSION)
+            graph = ResumeAnalysisService._build_analysis_graph(
+                application.resume_file_path, vacancy_requirements, file_hash, stored_resume_data
+            )
+            results, timings = await graph.run()
+            logger.info(f"Resume analysis stages for application {application.id}: {timings}")
             
-            if not resume_text or len(resume_text.strip()) < 50:
+            if "ocr" not in results:
                 logger.warning(f"Could not extract meaningful text from resume: {application.resume_file_path}")
-                return await ResumeAnalysisService._create_fallback_analysis(application, db)
+                return {
+                    **await ResumeAnalysisService._analysis_failed(application, db, "No meaningful text extracted"),
+                    "stage_timings": timings
+                }
             
-            ai_service = get_ai_service()
-            vacancy_requirements = ResumeAnalysisService._format_vacancy_requirements(vacancy)
-            ai_analysis = await ai_service.analyze_resume(resume_text, vacancy_requirements)
-            resume_data = await ai_service.extract_resume_data(resume_text)
+            resume_text, preprocessing = results["ocr"]
+            ai_analysis, resume_data = ResumeAnalysisService._collect_ai_results(results, resume_text)
+            if ai_analysis.get("fallback"):
+                # LLM недоступен - не сохраняем базовую структуру как оценку, задача будет повторена
+                return {
+                    **await ResumeAnalysisService._analysis_failed(application, db, "AI analysis unavailable"),
+                    "stage_timings": timings
+                }
+            if stored_resume_data is not None:
+                resume_data = stored_resume_data
             await ResumeAnalysisService._update_application_with_analysis(
-                application, ai_analysis, resume_data, db
+                application, ai_analysis, resume_data, db,
+                vacancy_fingerprint=ResumeAnalysisService.requirements_fingerprint(vacancy_requirements)
             )
             
             return {
                 "success": True,
                 "analysis": ai_analysis,
                 "resume_data": resume_data,
-                "resume_text_length": len(resume_text)
+                "resume_text_length": len(resume_text),
+                "preprocessing": preprocessing,
+                "stage_timings": timings
             }
             
         except Exception as e:
             logger.error(f"Error in resume analysis: {e}")
-            return await ResumeAnalysisService._create_fallback_analysis(application, db)
+            return await ResumeAnalysisService._analysis_failed(application, db, str(e))
+    
+    @staticmethod
+    def _build_analysis_graph(
+        pdf_path: str,
+        vacancy_requirements: str,
+        file_hash: Optional[str] = None,
+        stored_resume_data: Optional[Dict[str, Any]] = None
+    ) -> StageGraph:
+        """
+        Граф этапов анализа с учетом режима (fused/split) и каскада моделей
+
+        ocr -> fused | (analysis, extraction параллельно) -> cascade
+        Если данные резюме уже есть в хранилище (stored_resume_data), выполняется только analysis
+        """
+        ai_service = get_ai_service()
+        # В каскаде первый проход и извлечение данных выполняет дешевая модель
+        first_model = settings.ai_cascade_model if settings.ai_cascade_enabled else None
+        llm_timeout = settings.analysis_stage_llm_timeout
+        
+        async def ocr(deps):
+            resume_text, preprocessing = await ResumeAnalysisService._get_resume_text(pdf_path, file_hash)
+            if not resume_text or len(resume_text.strip()) < 50:
+                raise ValueError("No meaningful text extracted from resume")
+            return resume_text, preprocessing
+        
+        def coalesced(kind: str, func, *parts):
+            # Одинаковые одновременные запросы к LLM выполняются один раз
+            return ai_flight.do(fingerprint(kind, first_model, *parts), func)
+        
+        async def fused(deps):
+            resume_text = deps["ocr"][0]
+            result = await coalesced(
+                "fused",
+                lambda: ai_service.analyze_and_extract(resume_text, vacancy_requirements, model=first_model),
+                resume_text, vacancy_requirements,
+            )
+            await ResumeAnalysisService._store_resume_data(file_hash, result["resume_data"], result.get("source", "llm"))
+            return result
+        
+        async def extraction(deps):
+            resume_text = deps["ocr"][0]
+            resume_data, source = await coalesced(
+                "extraction",
+                lambda: ai_service.extract_resume_data(resume_text, model=first_model, with_source=True),
+                resume_text,
+            )
+            await ResumeAnalysisService._store_resume_data(file_hash, resume_data, source)
+            return resume_data
+        
+        stages = [Stage("ocr", ocr, timeout=settings.analysis_stage_ocr_timeout)]
+        if settings.ai_analysis_mode == "fused" and stored_resume_data is None:
+            first_pass = "fused"
+            stages.append(Stage("fused", fused, depends_on=["ocr"], timeout=llm_timeout))
+        else:
+            first_pass = "analysis"
+            stages.append(Stage(
+                "analysis",
+                lambda deps: coalesced(
+                    "analysis",
+                    lambda: ai_service.analyze_resume(deps["ocr"][0], vacancy_requirements, model=first_model),
+                    deps["ocr"][0], vacancy_requirements,
+                ),
+                depends_on=["ocr"],
+                timeout=llm_timeout,
+            ))
+            if stored_resume_data is None:
+                stages.append(Stage("extraction", extraction, depends_on=["ocr"], timeout=llm_timeout))
+        
+        if settings.ai_cascade_enabled:
+            def cascade(deps):
+                analysis = deps[first_pass]["analysis"] if first_pass == "fused" else deps[first_pass]
+                return ai_service.cascade_analyze_resume(
+                    deps["ocr"][0], vacancy_requirements, first_pass=analysis
+                )
+            stages.append(Stage("cascade", cascade, depends_on=["ocr", first_pass], timeout=llm_timeout))
+        
+        return StageGraph(stages)
+    
+    @staticmethod
+    async def _get_resume_data(
+        resume_text: str,
+        file_hash: Optional[str],
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Данные резюме из хранилища или извлечение LLM с сохранением"""
+        if file_hash:
+            stored = await resume_store.get_resume_data(file_hash, EXTRACTION_PROMPT_VERSION)
+            if stored is not None:
+                return stored
+        resume_data, source = await get_ai_service().extract_resume_data(resume_text, model=model, with_source=True)
+        await ResumeAnalysisService._store_resume_data(file_hash, resume_data, source)
+        return resume_data
+    
+    @staticmethod
+    async def _store_resume_data(file_hash: Optional[str], resume_data: Dict[str, Any], source: str):
+        # Заглушки, fallback и ответы симулятора не сохраняем
+        if file_hash and source in ("llm", "cache") and not get_ai_service().backend.simulated:
+            await resume_store.save_resume_data(file_hash, resume_data, EXTRACTION_PROMPT_VERSION)
+    
+    @staticmethod
+    def _collect_ai_results(results: Dict[str, Any], resume_text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Итоговые анализ и данные резюме из результатов этапов; для неудачных этапов - базовые структуры"""
+        ai_service = get_ai_service()
+        if "fused" in results:
+            ai_analysis = results["fused"]["analysis"]
+            resume_data = results["fused"]["resume_data"]
+        else:
+            ai_analysis = results.get("analysis")
+            resume_data = results.get("extraction")
+        
+        # Если эскалация каскада не успела, остается оценка первого прохода
+        ai_analysis = results.get("cascade") or ai_analysis
+        if ai_analysis is None:
+            ai_analysis = ai_service._create_fallback_analysis(resume_text)
+        if resume_data is None:
+            resume_data = ai_service._create_fallback_resume_data()
+        return ai_analysis, resume_data
     
     @staticmethod
-    async def _extract_text_with_ocr(pdf_path: str) -> str:
+    async def stream_analyze_application(
+        application: VacancyApplication,
+        vacancy: Vacancy,
+        db: AsyncSession
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Извлекает текст из PDF с помощью OCR микросервиса
+        Потоковый анализ заявки: поля анализа выдаются по мере готовности,
+        итоговый результат сохраняется так же, как в analyze_resume_application
+
+        При включенном каскаде поток идет от дешевой модели, а после его окончания
+        выполняется эскалация каскада; событие result содержит итоговую оценку.
+        Анализ и извлечение данных здесь - отдельные запросы (fused не используется),
+        т.к. клиенту по частям выдаются поля ответа анализа.
         """
+        yield {"type": "status", "stage": "ocr"}
+        file_hash = await ResumeAnalysisService._resume_sha256(application)
+        resume_text, preprocessing = await ResumeAnalysisService._get_resume_text(application.resume_file_path, file_hash)
+        
+        if not resume_text or len(resume_text.strip()) < 50:
+            logger.warning(f"Could not extract meaningful text from resume: {application.resume_file_path}")
+            yield {"type": "error", **await ResumeAnalysisService._analysis_failed(application, db, "No meaningful text extracted")}
+            return
+        
+        yield {"type": "status", "stage": "analysis"}
+        ai_service = get_ai_service()
+        first_model = settings.ai_cascade_model if settings.ai_cascade_enabled else None
+        vacancy_requirements = ResumeAnalysisService._format_vacancy_requirements(vacancy)
+        # Извлечение данных не нужно клиенту по частям, выполняем его параллельно с потоком анализа
+        extraction = asyncio.create_task(ResumeAnalysisService._get_resume_data(resume_text, file_hash, first_model))
+        
+        ai_analysis: Dict[str, Any] = {}
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_content = file.read()
-            async with aiohttp.ClientSession() as session:
-                data = aiohttp.FormData()
-                data.add_field('file', pdf_content, filename=os.path.basename(pdf_path), content_type='application/pdf')
-                async with session.post(f"{OCR_SERVICE_URL}/ocr/process-pdf", data=data, timeout=300) as resp:
-                    if resp.status != 200:
-                        logger.error(f"OCR service error: {resp.status} {await resp.text()}")
-                        return ""
-                    payload = await resp.json()
-                    pages = payload.get('extracted_text', [])
-                    full_text = "\n".join([p.get('text', '') for p in pages])
-                    if full_text and len(full_text.strip()) > 50:
-                        logger.info("Successfully extracted text using OCR microservice")
-                        return full_text
-                    return ""
-        except Exception as e:
-            logger.error(f"Error in OCR microservice call: {e}")
-            return ""
+            async for event in ai_service.stream_analyze_resume(resume_text, vacancy_requirements, model=first_model):
+                if event["type"] == "result":
+                    ai_analysis = event["analysis"]
+                else:
+                    yield event
+            if settings.ai_cascade_enabled:
+                yield {"type": "status", "stage": "cascade"}
+                try:
+                    ai_analysis = await asyncio.wait_for(
+                        ai_service.cascade_analyze_resume(resume_text, vacancy_requirements, first_pass=ai_analysis),
+                        timeout=settings.analysis_stage_llm_timeout
+                    )
+                except Exception as e:
+                    # Как и в графе этапов: если эскалация не успела, остается оценка первого прохода
+                    logger.warning(f"Cascade stage failed for application {application.id}: {e}")
+            resume_data = await extraction
+        finally:
+            if not extraction.done():
+                extraction.cancel()
+        
+        if ai_analysis.get("fallback"):
+            yield {"type": "error", **await ResumeAnalysisService._analysis_failed(application, db, "AI analysis unavailable")}
+            return
+        
+        await ResumeAnalysisService._update_application_with_analysis(
+            application, ai_analysis, resume_data, db,
+            vacancy_fingerprint=ResumeAnalysisService.requirements_fingerprint(vacancy_requirements)
+        )
+        yield {
+            "type": "result",
+            "success": True,
+            "analysis": ai_analysis,
+            "resume_data": resume_data,
+            "resume_text_length": len(resume_text),
+            "preprocessing": preprocessing
+        }
+    
+    @staticmethod
+    async def _extract_pages_with_ocr(
+        pdf_path: str,
+        on_page: Optional[Callable[[int, str], None]] = None
+    ) -> Tuple[List[str], bool]:
+        """
+        Извлекает текст из PDF по страницам: текстовый слой читается локально,
+        страницы без него распознает OCR микросервис
+
+        Возвращает страницы и признак того, что распознаны все страницы;
+        on_page - см. HybridTextExtractor.extract_pages
+        """
+        if settings.pdf_text_layer_enabled:
+            pages, complete = await hybrid_extractor.extract_pages(pdf_path, on_page)
+        else:
+            pages = await ocr_client.extract_pages(pdf_path, on_page)
+            complete = bool(pages)
+        full_text = "\n".join(pages)
+        if full_text and len(full_text.strip()) > 50:
+            logger.info(f"Successfully extracted text from {pdf_path}")
+            return pages, complete
+        return [], False
+    
+    @staticmethod
+    async def _get_resume_text(pdf_path: str, file_hash: Optional[str] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        OCR резюме и подготовка текста для LLM (очистка, бюджет токенов)
+
+        Возвращает текст и статистику предобработки
+        """
+        if file_hash is None:
+            try:
+                file_hash = await asyncio.to_thread(_file_sha256, pdf_path)
+            except OSError as e:
+                logger.error(f"Could not read resume file {pdf_path}: {e}")
+                return "", None
+        return await ocr_flight.do(file_hash, lambda: ResumeAnalysisService._get_resume_text_uncoalesced(pdf_path, file_hash))
+    
+    @staticmethod
+    async def _get_resume_text_uncoalesced(pdf_path: str, file_hash: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        # Уже распознанный PDF (в том числе загруженный на другую вакансию) повторно в OCR не отправляем
+        pages = await resume_store.get_pages(file_hash)
+        # Страницы нормализуются по мере получения, пока следующие еще распознаются
+        normalized: Dict[int, Tuple[str, List[str]]] = {}
+        
+        def on_page(index: int, text: str):
+            if settings.resume_preprocessing_enabled:
+                normalized[index] = (text, ResumePreprocessor.normalize_page(text))
+        
+        if pages is None:
+            started = time.monotonic()
+            pages, complete = await ResumeAnalysisService._extract_pages_with_ocr(pdf_path, on_page)
+            # Неудачный или частичный OCR не сохраняем, чтобы следующая попытка
+            # снова отправила нераспознанные страницы в сервис
+            if pages and complete:
+                await resume_store.save_ocr(file_hash, pages, (time.monotonic() - started) * 1000)
+        
+        if not pages or not settings.resume_preprocessing_enabled:
+            return "\n".join(pages), None
+        
+        # Нормализованная заранее страница годится, только если ее текст совпал с итоговым
+        page_lines = [
+            normalized[index][1] if index in normalized and normalized[index][0] == page else None
+            for index, page in enumerate(pages)
+        ]
+        resume_text, stats = ResumePreprocessor.preprocess(pages, settings.resume_token_budget, page_lines)
+        logger.info(
+            f"Resume preprocessing for {pdf_path}: {stats['original_tokens']} -> {stats['tokens']} tokens "
+            f"({stats['tokens_saved']} saved)"
+        )
+        return resume_text, stats
+    
+    @staticmethod
+    async def _resume_sha256(application: VacancyApplication) -> Optional[str]:
+        """SHA-256 файла резюме: сохраненный при загрузке или вычисленный по файлу"""
+        if application.resume_sha256:
+            return application.resume_sha256
+        try:
+            return await asyncio.to_thread(_file_sha256, application.resume_file_path)
+        except (OSError, TypeError) as e:
+            logger.error(f"Could not read resume file {application.resume_file_path}: {e}")
+            return None
+    
+    @staticmethod
+    def get_stats() -> Dict[str, Any]:
+        """Метрики объединения одинаковых запросов, OCR и пакетного анализа"""
+        return {
+            "ocr_single_flight": ocr_flight.stats(),
+            "ai_single_flight": ai_flight.stats(),
+            "ocr_client": ocr_client.stats(),
+            "text_extraction": hybrid_extractor.stats(),
+            "pdf_engine": pdf_engine.stats(),
+            "resume_store": resume_store.stats(),
+            "batches": batch_store.stats(),
+        }
     
     @staticmethod
     def _format_vacancy_requirements(vacancy: Vacancy) -> str:
@@ -107,43 +424,130 @@ class ResumeAnalysisService:
         
         return "\n".join(requirements)
     
+    @staticmethod
+    def requirements_fingerprint(vacancy_requirements: str) -> str:
+        """Отпечаток требований вакансии, по которым была выставлена оценка"""
+        return hashlib.sha256(vacancy_requirements.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def vacancy_fingerprint(vacancy: Vacancy) -> str:
+        return ResumeAnalysisService.requirements_fingerprint(
+            ResumeAnalysisService._format_vacancy_requirements(vacancy)
+        )
+    
+    @staticmethod
+    async def rescore_vacancy(vacancy: Vacancy, db: AsyncSession) -> int:
+        """
+        Ставит в очередь повторный анализ заявок, оцененных по устаревшим требованиям вакансии
+
+        Заявки с актуальным отпечатком и заявки, у которых уже есть незавершенная
+        задача анализа, пропускаются: задача в работе могла прочитать старые требования,
+        поэтому после ее завершения отпечаток сверяется еще раз (requeue_stale).
+        Текст резюме берется из resume_documents, повторного OCR нет.
+        Возвращает количество поставленных задач.
+        """
+        from app.services.analysis_jobs import AnalysisJobQueue
+        
+        fingerprint_now = ResumeAnalysisService.vacancy_fingerprint(vacancy)
+        active_jobs = select(AnalysisJob.application_id).where(
+            AnalysisJob.status.in_(("pending", "running"))
+        )
+        result = await db.execute(
+            select(VacancyApplication.id).where(
+                VacancyApplication.vacancy_id == vacancy.id,
+                VacancyApplication.resume_file_path.is_not(None),
+                VacancyApplication.ai_analysis_date.is_not(None),
+                or_(
+                    VacancyApplication.ai_vacancy_fingerprint.is_(None),
+                    VacancyApplication.ai_vacancy_fingerprint != fingerprint_now,
+                ),
+                VacancyApplication.id.not_in(active_jobs),
+            )
+        )
+        stale_ids = list(result.scalars().all())
+        if stale_ids:
+            await AnalysisJobQueue.enqueue_many(db, stale_ids)
+        logger.info(f"Vacancy {vacancy.id} requirements changed, {len(stale_ids)} applications queued for re-scoring")
+        return len(stale_ids)
+    
+    @staticmethod
+    async def requeue_stale(db: AsyncSession, application_ids: List[int]) -> int:
+        """
+        Ставит в очередь повторный анализ только что оцененных заявок, если требования
+        вакансии изменились, пока шел анализ
+
+        Вызывается после коммита итога задачи. Возвращает количество поставленных задач.
+        """
+        if not application_ids:
+            return 0
+        from app.services.analysis_jobs import AnalysisJobQueue
+        
+        active_jobs = select(AnalysisJob.application_id).where(
+            AnalysisJob.status.in_(("pending", "running"))
+        )
+        result = await db.execute(
+            select(VacancyApplication.id, VacancyApplication.ai_vacancy_fingerprint, Vacancy)
+            .join(Vacancy, VacancyApplication.vacancy_id == Vacancy.id)
+            .where(
+                VacancyApplication.id.in_(application_ids),
+                VacancyApplication.id.not_in(active_jobs),
+            )
+            # Вакансия могла быть загружена в сессию до изменения требований
+            .execution_options(populate_existing=True)
+        )
+        stale_ids = [
+            application_id
+            for application_id, fingerprint, vacancy in result.all()
+            if fingerprint != ResumeAnalysisService.vacancy_fingerprint(vacancy)
+        ]
+        if stale_ids:
+            await AnalysisJobQueue.enqueue_many(db, stale_ids)
+            logger.info(f"Requirements changed during analysis, {len(stale_ids)} applications queued for re-scoring")
+        return len(stale_ids)
+    
+    @staticmethod
+    def _analysis_columns(ai_analysis: Dict[str, Any], resume_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Значения колонок заявки с результатами AI анализа
+
+        Анализ и данные резюме хранятся структурно (JSONB), навыки - отдельным
+        списком в нижнем регистре для поиска по индексу. Заметки HR (notes) не трогаем.
+        Пустой resume_data не перезаписывает ранее извлеченные данные; навыки для поиска
+        тогда берутся из анализа (пакетный анализ не извлекает данные резюме).
+        """
+        match_percentage = parse_match_percentage(ai_analysis.get('match_percentage'))
+        values = {
+            "ai_recommendation": ai_analysis.get('recommendation', 'Анализ недоступен'),
+            "ai_match_percentage": match_percentage,
+            "ai_analysis_date": datetime.utcnow(),
+            "ai_cascade": ai_analysis.get('cascade'),
+            "ai_analysis": {key: value for key, value in ai_analysis.items() if key != 'cascade'},
+        }
+        if resume_data:
+            skills = resume_data.get('skills') or []
+            values["ai_resume_data"] = resume_data
+        else:
+            skills = ai_analysis.get('skills')
+        if isinstance(skills, list):
+            values["ai_skills"] = sorted({
+                str(skill).strip().lower() for skill in skills if str(skill).strip()
+            })
+        return values
+    
     @staticmethod
     async def _update_application_with_analysis(
         application: VacancyApplication,
         ai_analysis: Dict[str, Any],
         resume_data: Dict[str, Any],
-        db: AsyncSession
+        db: AsyncSession,
+        vacancy_fingerprint: Optional[str] = None
     ):
         """Обновляет заявку с результатами AI анализа"""
         try:
-            application.ai_recommendation = ai_analysis.get('recommendation', 'Анализ недоступен')
-            application.ai_match_percentage = ai_analysis.get('match_percentage', 50)
-            application.ai_analysis_date = datetime.utcnow()
-            detailed_analysis = ai_analysis.get('detailed_analysis', '')
-            strengths = ai_analysis.get('strengths', [])
-            weaknesses = ai_analysis.get('weaknesses', [])
-            analysis_notes = f"""
-AI АНАЛИЗ РЕЗЮМЕ:
-
-Рекомендация: {application.ai_recommendation}
-Соответствие: {application.ai_match_percentage}%
-
-СИЛЬНЫЕ СТОРОНЫ:
-{chr(10).join(f"- {strength}" for strength in strengths)}
-
-СЛАБЫЕ СТОРОНЫ:
-{chr(10).join(f"- {weakness}" for weakness in weaknesses)}
-
-ДЕТАЛЬНЫЙ АНАЛИЗ:
-{detailed_analysis}
-
-ИЗВЛЕЧЕННЫЕ ДАННЫЕ:
-- Имя: {resume_data.get('name', 'Не определено')}
-- Опыт: {resume_data.get('experience_years', 0)} лет
-- Образование: {resume_data.get('education', 'Не указано')}
-- Навыки: {', '.join(resume_data.get('skills', []))}
-"""
-            application.notes = analysis_notes
+            values = ResumeAnalysisService._analysis_columns(ai_analysis, resume_data)
+            for field, value in values.items():
+                setattr(application, field, value)
+            application.ai_vacancy_fingerprint = vacancy_fingerprint
             await db.commit()
             await db.refresh(application)
         except Exception as e:
@@ -151,64 +555,219 @@ AI АНАЛИЗ РЕЗЮМЕ:
             await db.rollback()
     
     @staticmethod
-    async def _create_fallback_analysis(
-        application: VacancyApplication, 
-        db: AsyncSession
+    async def _analysis_failed(
+        application: VacancyApplication,
+        db: AsyncSession,
+        error: str
     ) -> Dict[str, Any]:
-        """Создает базовый анализ в случае ошибки"""
+        """
+        Итог неудачного анализа
+
+        Колонки оценки заявки не трогаем: прежний анализ (если он был) остается
+        в силе, а заявка без анализа не попадает в поиск с выдуманной оценкой.
+        Состояние и повтор ведет задача анализа (AnalysisJob.last_error).
+        """
+        logger.warning(f"Analysis of application {application.id} failed: {error}")
         try:
-            application.ai_recommendation = "Требует ручной проверки"
-            application.ai_match_percentage = 50
-            application.ai_analysis_date = datetime.utcnow()
-            application.notes = "Автоматический анализ недоступен. Требуется ручная проверка резюме."
-            await db.commit()
-            await db.refresh(application)
-            return {"success": False, "error": "Could not analyze resume automatically", "fallback": True}
+            await db.rollback()
         except Exception as e:
-            logger.error(f"Error creating fallback analysis: {e}")
-            return {"success": False, "error": str(e), "fallback": False}
+            logger.error(f"Error rolling back failed analysis: {e}")
+        return {"success": False, "error": error, "fallback": True}
     
     @staticmethod
     async def batch_analyze_applications(
         applications: list[VacancyApplication],
-        db: AsyncSession
+        db: AsyncSession,
+        progress: Optional[BatchProgress] = None
     ) -> Dict[str, Any]:
         """
         Пакетный анализ нескольких заявок
+
+        Конвейер: OCR -> LLM -> запись в БД. Этапы связаны ограниченными очередями,
+        поэтому OCR следующих резюме идет параллельно с анализом предыдущих, а память
+        не растет с размером пакета. Результаты записываются пачками UPDATE.
+        Ошибка одной заявки не прерывает пакет. Если передан progress, в него
+        сообщается о каждой заявке по мере записи результата.
         """
         try:
-            ai_service = get_ai_service()
-            batch_data = []
+            vacancy_ids = {app.vacancy_id for app in applications}
+            result = await db.execute(select(Vacancy).where(Vacancy.id.in_(vacancy_ids)))
+            vacancies = {vacancy.id: vacancy for vacancy in result.scalars().all()}
+        except Exception as e:
+            logger.error(f"Error in batch analysis: {e}")
+            return {"success": False, "error": str(e)}
+        
+        ai_service = get_ai_service()
+        ocr_workers = max(1, settings.batch_ocr_concurrency)
+        llm_workers = max(1, settings.batch_llm_concurrency)
+        ocr_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.batch_queue_size)
+        llm_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.batch_queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.batch_queue_size)
+        failed: List[Dict[str, Any]] = []
+        counters = {"processed": 0, "updated": 0}
+        
+        def fail(app_id: int, error: str, started: bool = True):
+            failed.append({"application_id": app_id, "error": error})
+            if progress:
+                progress.item_failed(app_id, error, started)
+        
+        async def produce():
             for app in applications:
-                if app.resume_file_path:
-                    resume_text = await ResumeAnalysisService._extract_text_with_ocr(app.resume_file_path)
-                    if resume_text and len(resume_text.strip()) > 50:
-                        vacancy_result = await db.execute(
-                            "SELECT * FROM vacancies WHERE id = %s", (app.vacancy_id,)
-                        )
-                        vacancy = vacancy_result.fetchone()
-                        if vacancy:
-                            vacancy_requirements = ResumeAnalysisService._format_vacancy_requirements(vacancy)
-                            batch_data.append({
-                                'application_id': app.id,
-                                'resume_text': resume_text,
-                                'vacancy_requirements': vacancy_requirements
-                            })
-            if not batch_data:
-                return {"success": False, "error": "No valid resumes found for batch analysis"}
-            results = await ai_service.batch_analyze_resumes(batch_data)
-            updated_count = 0
-            for i, result in enumerate(results):
-                if i < len(batch_data):
-                    app_id = batch_data[i]['application_id']
-                    for app in applications:
-                        if app.id == app_id:
-                            await ResumeAnalysisService._update_application_with_analysis(
-                                app, result, {}, db
-                            )
-                            updated_count += 1
-                            break
-            return {"success": True, "processed_count": len(batch_data), "updated_count": updated_count}
+                vacancy = vacancies.get(app.vacancy_id)
+                if not app.resume_file_path:
+                    fail(app.id, "No resume file", started=False)
+                elif vacancy is None:
+                    fail(app.id, "Vacancy not found", started=False)
+                else:
+                    await ocr_queue.put((app.id, app.resume_file_path, vacancy))
+            for _ in range(ocr_workers):
+                await ocr_queue.put(None)
+        
+        async def ocr_worker():
+            while (item := await ocr_queue.get()) is not None:
+                app_id, pdf_path, vacancy = item
+                if progress:
+                    progress.item_started(app_id)
+                try:
+                    resume_text, _ = await ResumeAnalysisService._get_resume_text(pdf_path)
+                    if not resume_text or len(resume_text.strip()) <= 50:
+                        fail(app_id, "No meaningful text extracted")
+                        continue
+                    vacancy_requirements = ResumeAnalysisService._format_vacancy_requirements(vacancy)
+                    await llm_queue.put((app_id, resume_text, vacancy_requirements))
+                except Exception as e:
+                    logger.error(f"Batch OCR failed for application {app_id}: {e}")
+                    fail(app_id, str(e))
+        
+        async def llm_worker():
+            while (item := await llm_queue.get()) is not None:
+                app_id, resume_text, vacancy_requirements = item
+                try:
+                    analysis = await ai_flight.do(
+                        fingerprint("score", resume_text, vacancy_requirements),
+                        lambda: ai_service.score_resume(resume_text, vacancy_requirements),
+                    )
+                    if analysis.get("fallback"):
+                        fail(app_id, "AI analysis unavailable")
+                        continue
+                    counters["processed"] += 1
+                    await write_queue.put(
+                        (ResumeAnalysisService._analysis_values(app_id, analysis, {}, vacancy_requirements), analysis)
+                    )
+                except Exception as e:
+                    logger.error(f"Batch AI analysis failed for application {app_id}: {e}")
+                    fail(app_id, str(e))
+        
+        async def writer():
+            pending: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+            while True:
+                item = await write_queue.get()
+                if item is not None:
+                    pending.append(item)
+                # Пишем, когда пачка набрана или новых результатов пока нет -
+                # при малой нагрузке результаты не ждут заполнения пачки
+                if pending and (item is None or write_queue.empty() or len(pending) >= settings.batch_write_size):
+                    await flush(pending)
+                    pending = []
+                if item is None:
+                    return
+        
+        async def flush(items: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+            rows = [row for row, _ in items]
+            try:
+                # ORM bulk UPDATE по первичному ключу - один executemany на пачку
+                await db.execute(update(VacancyApplication), rows)
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Batch write of {len(rows)} applications failed: {e}")
+                await db.rollback()
+                for row in rows:
+                    fail(row["id"], str(e))
+                return
+            counters["updated"] += len(rows)
+            if progress:
+                for row, analysis in items:
+                    progress.item_done(row["id"], analysis)
+        
+        async def run_stage(workers: List[asyncio.Task], next_queue: asyncio.Queue, next_workers: int):
+            await asyncio.gather(*workers)
+            for _ in range(next_workers):
+                await next_queue.put(None)
+        
+        tasks = [
+            asyncio.create_task(produce()),
+            asyncio.create_task(run_stage(
+                [asyncio.create_task(ocr_worker()) for _ in range(ocr_workers)], llm_queue, llm_workers
+            )),
+            asyncio.create_task(run_stage(
+                [asyncio.create_task(llm_worker()) for _ in range(llm_workers)], write_queue, 1
+            )),
+            asyncio.create_task(writer()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
         except Exception as e:
             logger.error(f"Error in batch analysis: {e}")
+            for task in tasks:
+                task.cancel()
             return {"success": False, "error": str(e)}
+        
+        if not counters["processed"]:
+            return {"success": False, "error": "No valid resumes found for batch analysis", "failed": failed}
+        return {
+            "success": True,
+            "processed_count": counters["processed"],
+            "updated_count": counters["updated"],
+            "failed": failed
+        }
+    
+    @staticmethod
+    async def start_batch_analysis(
+        db: AsyncSession,
+        application_ids: List[int],
+        owner_id: Optional[int] = None
+    ) -> AnalysisBatch:
+        """
+        Создает пакет (задачи очереди анализа с batch_id) и запускает его конвейер в фоне
+
+        Пакет работает в своей сессии БД, т.к. переживает HTTP запрос, который его
+        запустил. Прогресс хранится в задачах пакета: его видят все процессы API,
+        а при остановке процесса незавершенные заявки выполнят воркеры очереди.
+        """
+        batch, progress = await batch_store.create(db, application_ids, owner_id)
+        
+        async def run():
+            sync = asyncio.create_task(progress.run_sync())
+            error = None
+            try:
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(
+                        select(VacancyApplication).where(VacancyApplication.id.in_(application_ids))
+                    )
+                    applications = list(result.scalars().all())
+                    summary = await ResumeAnalysisService.batch_analyze_applications(applications, session, progress)
+                if not summary.get("success"):
+                    error = summary.get("error")
+            except Exception as e:
+                logger.error(f"Error in batch analysis {batch.id}: {e}")
+                error = str(e)
+            finally:
+                sync.cancel()
+            await progress.finish(error)
+        
+        batch_store.track(asyncio.create_task(run()))
+        return batch
+    
+    @staticmethod
+    def _analysis_values(
+        application_id: int,
+        ai_analysis: Dict[str, Any],
+        resume_data: Dict[str, Any],
+        vacancy_requirements: str
+    ) -> Dict[str, Any]:
+        """Значения колонок заявки для пакетного UPDATE"""
+        return {
+            "id": application_id,
+            **ResumeAnalysisService._analysis_columns(ai_analysis, resume_data),
+            "ai_vacancy_fingerprint": ResumeAnalysisService.requirements_fingerprint(vacancy_requirements),
+        }
@@ -0,0 +1,228 @@
+"""
+Подготовка текста резюме перед отправкой в LLM: очистка и ограничение по токенам
+"""
+
+import logging
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Грубая оценка, та же что у AIService для лимита TPM
+CHARS_PER_TOKEN = 4
+
+# Сколько строк в начале и конце страницы проверяем на колонтитулы
+HEADER_FOOTER_LINES = 3
+
+# Повторы удаляются только у длинных строк: короткие ("Python", "Разработка")
+# законно повторяются в разных местах работы
+DUPLICATE_LINE_MIN_CHARS = 60
+
+# Разделы резюме в порядке важности для анализа (при обрезке по бюджету сохраняются первыми)
+SECTION_PRIORITY = [
+    "header",
+    "skills",
+    "experience",
+    "summary",
+    "education",
+    "projects",
+    "languages",
+    "courses",
+    "other",
+    "hobbies",
+]
+
+SECTION_HEADINGS = {
+    "skills": ["навыки", "ключевые навыки", "технические навыки", "технологии", "стек", "skills", "tech stack"],
+    "experience": ["опыт работы", "опыт", "места работы", "work experience", "experience", "employment"],
+    "summary": ["о себе", "обо мне", "цель", "профиль", "summary", "about me", "about", "profile", "objective"],
+    "education": ["образование", "education"],
+    "projects": ["проекты", "projects"],
+    "languages": ["языки", "знание языков", "иностранные языки", "languages"],
+    "courses": ["курсы", "сертификаты", "повышение квалификации", "certificates", "certifications", "courses"],
+    "hobbies": ["хобби", "интересы", "увлечения", "hobbies", "interests"],
+}
+
+_HEADING_LOOKUP = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+_SPACES_RE = re.compile(r"[ \t\u00a0\u200b]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка количества токенов в тексте"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class ResumePreprocessor:
+    """Очистка текста резюме и обрезка до бюджета токенов"""
+
+    @staticmethod
+    def preprocess(
+        pages: List[str],
+        token_budget: Optional[int] = None,
+        page_lines: Optional[List[Optional[List[str]]]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Готовит текст резюме по страницам
+
+        page_lines - уже нормализованные страницы (normalize_page), например,
+        подготовленные по мере распознавания; None на месте страницы - нормализовать здесь.
+        Возвращает итоговый текст и статистику (токены до/после, сэкономлено)
+        """
+        original_text = "\n".join(pages)
+        original_tokens = estimate_tokens(original_text)
+
+        page_lines = [
+            lines if lines is not None else ResumePreprocessor.normalize_page(page)
+            for page, lines in zip(pages, page_lines or [None] * len(pages))
+        ]
+        page_lines, removed_header_lines = ResumePreprocessor._drop_headers_footers(page_lines)
+        lines = [line for page in page_lines for line in page]
+        lines, removed_duplicates = ResumePreprocessor._drop_duplicate_lines(lines)
+
+        text = ResumePreprocessor._join_lines(lines)
+        truncated = False
+        if token_budget and estimate_tokens(text) > token_budget:
+            text = ResumePreprocessor._trim_to_budget(lines, token_budget)
+            truncated = True
+
+        tokens = estimate_tokens(text)
+        stats = {
+            "original_tokens": original_tokens,
+            "tokens": tokens,
+            "tokens_saved": original_tokens - tokens,
+            "removed_header_footer_lines": removed_header_lines,
+            "removed_duplicate_lines": removed_duplicates,
+            "truncated": truncated,
+        }
+        return text, stats
+
+    @staticmethod
+    def normalize_page(page: str) -> List[str]:
+        """Схлопывает пробелы и убирает лишние пустые строки"""
+        lines = []
+        for raw_line in page.splitlines():
+            line = _SPACES_RE.sub(" ", raw_line).strip()
+            if line or (lines and lines[-1]):
+                lines.append(line)
+        while lines and not lines[-1]:
+            lines.pop()
+        return lines
+
+    @staticmethod
+    def _drop_headers_footers(page_lines: List[List[str]]) -> Tuple[List[List[str]], int]:
+        """
+        Удаляет строки, повторяющиеся в начале или конце большинства страниц
+
+        Первое вхождение колонтитула остается: часто это имя и должность кандидата.
+        """
+        if len(page_lines) < 2:
+            return page_lines, 0
+
+        def zones(lines: List[str]) -> Tuple[set, set]:
+            positions = [i for i, line in enumerate(lines) if line]
+            return set(positions[:HEADER_FOOTER_LINES]), set(positions[-HEADER_FOOTER_LINES:])
+
+        def key(line: str) -> str:
+            # Номера страниц отличаются, поэтому цифры не учитываем
+            return _DIGITS_RE.sub("#", line.lower())
+
+        # Верхние и нижние колонтитулы считаем отдельно, чтобы не путать их с переносом текста между страницами
+        header_counts: Counter = Counter()
+        footer_counts: Counter = Counter()
+        page_zones = [zones(lines) for lines in page_lines]
+        for lines, (header_zone, footer_zone) in zip(page_lines, page_zones):
+            header_counts.update({key(lines[i]) for i in header_zone})
+            footer_counts.update({key(lines[i]) for i in footer_zone})
+
+        threshold = max(2, math.ceil(len(page_lines) / 2))
+        repeated_headers = {k for k, count in header_counts.items() if count >= threshold}
+        repeated_footers = {k for k, count in footer_counts.items() if count >= threshold}
+        if not repeated_headers and not repeated_footers:
+            return page_lines, 0
+
+        removed = 0
+        result = []
+        seen = set()
+        for lines, (header_zone, footer_zone) in zip(page_lines, page_zones):
+            kept = []
+            for i, line in enumerate(lines):
+                line_key = key(line)
+                if (i in header_zone and line_key in repeated_headers) or (
+                    i in footer_zone and line_key in repeated_footers
+                ):
+                    if line_key in seen:
+                        removed += 1
+                        continue
+                    seen.add(line_key)
+                kept.append(line)
+            result.append(kept)
+        return result, removed
+
+    @staticmethod
+    def _drop_duplicate_lines(lines: List[str]) -> Tuple[List[str], int]:
+        """Удаляет повторы длинных строк (задвоение текста при OCR), оставляя первое вхождение"""
+        seen = set()
+        result = []
+        removed = 0
+        for line in lines:
+            key = line.lower()
+            if len(key) >= DUPLICATE_LINE_MIN_CHARS:
+                if key in seen:
+                    removed += 1
+                    continue
+                seen.add(key)
+            result.append(line)
+        return result, removed
+
+    @staticmethod
+    def _join_lines(lines: List[str]) -> str:
+        text = "\n".join(lines)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+    @staticmethod
+    def _detect_heading(line: str) -> Optional[str]:
+        key = line.lower().strip(" :.-•*#")
+        if len(key) > 40:
+            return None
+        return _HEADING_LOOKUP.get(key)
+
+    @staticmethod
+    def _split_sections(lines: List[str]) -> List[Tuple[str, List[str]]]:
+        """Делит резюме на разделы по заголовкам; текст до первого заголовка - header"""
+        sections: List[Tuple[str, List[str]]] = [("header", [])]
+        for line in lines:
+            section = ResumePreprocessor._detect_heading(line) if line else None
+            if section:
+                sections.append((section, [line]))
+            else:
+                sections[-1][1].append(line)
+        return [(name, body) for name, body in sections if any(body)]
+
+    @staticmethod
+    def _trim_to_budget(lines: List[str], token_budget: int) -> str:
+        """Оставляет разделы по приоритету, пока они помещаются в бюджет, сохраняя исходный порядок"""
+        sections = ResumePreprocessor._split_sections(lines)
+        order = sorted(
+            range(len(sections)),
+            key=lambda i: SECTION_PRIORITY.index(sections[i][0]) if sections[i][0] in SECTION_PRIORITY else len(SECTION_PRIORITY),
+        )
+
+        budget_chars = token_budget * CHARS_PER_TOKEN
+        kept: Dict[int, List[str]] = {}
+        for index in order:
+            if budget_chars <= 0:
+                break
+            body = []
+            for line in sections[index][1]:
+                cost = len(line) + 1
+                if cost > budget_chars:
+                    break
+                body.append(line)
+                budget_chars -= cost
+            if body:
+                kept[index] = body
+
+        return ResumePreprocessor._join_lines([line for index in sorted(kept) for line in kept[index]])
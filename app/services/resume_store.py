@@ -0,0 +1,121 @@
+"""
+Хранилище результатов OCR и извлечения данных резюме по SHA-256 содержимого PDF
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from app.db.session import AsyncSessionLocal
+from app.models.resume_document import ResumeDocument
+
+logger = logging.getLogger(__name__)
+
+
+class ResumeDocumentStore:
+    """
+    Один и тот же PDF, загруженный на несколько вакансий, распознается и
+    разбирается LLM один раз: результаты хранятся в resume_documents
+
+    Методы открывают собственную сессию, т.к. вызываются из этапов анализа,
+    которые выполняются параллельно с основной сессией заявки.
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.ocr_hits = 0
+        self.ocr_misses = 0
+        self.extraction_hits = 0
+        self.extraction_misses = 0
+
+    async def ensure(self, sha256: str) -> bool:
+        """Создает запись документа, если ее еще нет (перед ссылкой из заявки)"""
+        try:
+            async with self.session_factory() as session:
+                if await session.get(ResumeDocument, sha256) is None:
+                    session.add(ResumeDocument(sha256=sha256))
+                    await session.commit()
+            return True
+        except IntegrityError:
+            # Тот же файл одновременно загрузили в другом запросе
+            return True
+        except Exception as e:
+            logger.warning(f"Could not create resume document {sha256[:12]}: {e}")
+            return False
+
+    async def get(self, sha256: str) -> Optional[ResumeDocument]:
+        try:
+            async with self.session_factory() as session:
+                return await session.get(ResumeDocument, sha256)
+        except Exception as e:
+            logger.warning(f"Resume document lookup failed: {e}")
+            return None
+
+    async def get_pages(self, sha256: str) -> Optional[List[str]]:
+        """Текст страниц, если документ уже распознан"""
+        document = await self.get(sha256)
+        if document is None or document.pages is None:
+            self.ocr_misses += 1
+            return None
+        self.ocr_hits += 1
+        return document.pages
+
+    async def get_resume_data(self, sha256: str, version: str) -> Optional[Dict[str, Any]]:
+        """Извлеченные данные резюме, если они получены текущей версией промпта"""
+        document = await self.get(sha256)
+        if document is None or document.resume_data is None or document.extraction_version != version:
+            self.extraction_misses += 1
+            return None
+        self.extraction_hits += 1
+        return document.resume_data
+
+    async def save_ocr(self, sha256: str, pages: List[str], duration_ms: float):
+        await self._update(
+            sha256,
+            pages=pages,
+            text="\n".join(pages),
+            page_count=len(pages),
+            ocr_duration_ms=round(duration_ms, 1),
+            ocr_at=datetime.utcnow(),
+        )
+
+    async def save_resume_data(self, sha256: str, resume_data: Dict[str, Any], version: str):
+        await self._update(
+            sha256,
+            resume_data=resume_data,
+            extraction_version=version,
+            extracted_at=datetime.utcnow(),
+        )
+
+    async def _update(self, sha256: str, **values):
+        for attempt in range(2):
+            try:
+                async with self.session_factory() as session:
+                    document = await session.get(ResumeDocument, sha256)
+                    if document is None:
+                        document = ResumeDocument(sha256=sha256)
+                        session.add(document)
+                    for field, value in values.items():
+                        setattr(document, field, value)
+                    await session.commit()
+                return
+            except IntegrityError:
+                # Запись создали параллельно - повторяем как обновление
+                continue
+            except Exception as e:
+                logger.warning(f"Could not store resume document {sha256[:12]}: {e}")
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ocr_hits": self.ocr_hits,
+            "ocr_misses": self.ocr_misses,
+            "extraction_hits": self.extraction_hits,
+            "extraction_misses": self.extraction_misses,
+        }
+
+
+# Глобальный экземпляр хранилища
+resume_store = ResumeDocumentStore()
@@ -0,0 +1,62 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(*parts: Any) -> str:
+    """Отпечаток входных данных запроса"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Одновременные вызовы с одинаковым ключом ждут один общий результат
+
+    Вызов выполняется в отдельной задаче, поэтому отмена одного из ожидающих
+    не отменяет работу для остальных. Результат общий для всех вызвавших.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.shared = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            logger.info(f"Joining in-flight {self.name} call {key[:12]}")
+            return await asyncio.shield(task)
+
+        self.executed += 1
+        task = asyncio.ensure_future(func())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._calls.pop(key, None)
+        # Помечаем исключение полученным, даже если все ожидающие были отменены
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "executed": self.executed,
+            "shared": self.shared,
+        }
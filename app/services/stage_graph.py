@@ -0,0 +1,98 @@
+"""
+Граф этапов обработки: независимые этапы выполняются параллельно
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    Этап графа
+
+    func получает словарь результатов этапов из depends_on. Если этап из
+    depends_on завершился неуспешно, этот этап пропускается (status "skipped").
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Dict[str, Any]], Awaitable[Any]],
+        depends_on: Sequence[str] = (),
+        timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+
+
+class StageGraph:
+    """Выполняет этапы, как только готовы их зависимости, и замеряет время каждого"""
+
+    def __init__(self, stages: List[Stage]):
+        seen = set()
+        for stage in stages:
+            # Зависимости объявляются раньше этапа - так граф гарантированно без циклов
+            missing = [dep for dep in stage.depends_on if dep not in seen]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on undeclared stages: {missing}")
+            if stage.name in seen:
+                raise ValueError(f"Duplicate stage '{stage.name}'")
+            seen.add(stage.name)
+        self.stages = stages
+
+    async def run(self) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """
+        Выполняет граф
+
+        Возвращает результаты успешных этапов и тайминги всех этапов
+        ({"status": ok|timeout|error|skipped, "started_ms": ..., "duration_ms": ...})
+        """
+        results: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, Any]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        started_at = time.monotonic()
+
+        async def run_stage(stage: Stage) -> bool:
+            for dep in stage.depends_on:
+                if not await tasks[dep]:
+                    timings[stage.name] = {"status": "skipped"}
+                    return False
+
+            stage_start = time.monotonic()
+            try:
+                results[stage.name] = await asyncio.wait_for(
+                    stage.func({dep: results[dep] for dep in stage.depends_on}),
+                    timeout=stage.timeout,
+                )
+                status = "ok"
+            except asyncio.TimeoutError:
+                logger.warning(f"Stage '{stage.name}' timed out after {stage.timeout}s")
+                status = "timeout"
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' failed: {e}")
+                status = "error"
+
+            timings[stage.name] = {
+                "status": status,
+                "started_ms": round((stage_start - started_at) * 1000, 1),
+                "duration_ms": round((time.monotonic() - stage_start) * 1000, 1),
+            }
+            return status == "ok"
+
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.create_task(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        timings["total"] = {"duration_ms": round((time.monotonic() - started_at) * 1000, 1)}
+        return results, timings
@@ -0,0 +1,65 @@
+"""
+Отдельный процесс воркеров AI анализа резюме
+
+Запуск: python -m app.worker [--concurrency N]
+
+Воркеры берут задачи из таблицы analysis_jobs через SELECT ... FOR UPDATE SKIP LOCKED,
+поэтому можно запускать сколько угодно процессов параллельно с API. В процессах API
+встроенные воркеры при этом стоит отключить: APP_ANALYSIS_WORKER_IN_PROCESS=false.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.db.session import Base, engine
+from app.services.ai_service import init_ai_service, get_ai_service, close_ai_service
+from app.services.analysis_jobs import analysis_job_queue
+from app.services.resume_analysis_service import ocr_client
+from app.services.pdf_engine import pdf_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_worker(concurrency: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    init_ai_service(settings.openrouter_api_key, settings.openrouter_model)
+    await get_ai_service().start()
+    await ocr_client.start()
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    await analysis_job_queue.start(concurrency)
+    logger.info(f"Analysis worker {analysis_job_queue.worker_id} is running")
+    
+    await stop_event.wait()
+    logger.info("Shutting down analysis worker")
+    await analysis_job_queue.stop()
+    await close_ai_service()
+    await ocr_client.close()
+    await pdf_engine.close()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воркер AI анализа резюме")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.analysis_worker_concurrency,
+        help="Сколько задач обрабатывать одновременно",
+    )
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()